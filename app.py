@@ -1,35 +1,43 @@
 from __future__ import annotations
 
+import hashlib
+import logging
 import os
 import re
 import sqlite3
 import shutil
 import secrets
-from concurrent.futures import TimeoutError as FutureTimeout
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 from decimal import Decimal, InvalidOperation
 from io import BytesIO
+from collections import OrderedDict
 from contextlib import contextmanager, suppress
 from datetime import datetime, timedelta
-from functools import wraps
+from functools import lru_cache, wraps
 from pathlib import Path
+from threading import Lock
 import json
 from typing import Dict, Any, Iterable, Optional
 
 from flask import (
     Flask, request, jsonify, session, redirect, url_for,
-    render_template, render_template_string, flash, send_file, g
+    render_template, flash, send_file, g
 )
+from jinja2 import ChoiceLoader, DictLoader
 from werkzeug.utils import secure_filename
 
-from services.db import get_app_db, close_app_db
+from services.db import connect_sqlite, close_sqlite, get_app_db, close_app_db
 from services.settings import settings_manager
 from services.users import (
     create_user,
     count_users,
     count_admins,
+    get_sole_active_admin_id,
     UserExistsError,
     EmailInUseError,
     authenticate_user,
+    authenticate_user_by_id,
     get_user_by_email,
     get_user_by_id,
     create_password_reset_token,
@@ -38,6 +46,7 @@ from services.users import (
     set_user_password,
     mark_user_login,
     list_users,
+    list_message_recipients,
     set_user_active,
     update_user_email,
     update_user_role,
@@ -45,7 +54,7 @@ from services.users import (
 from services.email import send_email_async, EmailConfigError, clear_email_cache
 from services.messages import (
     create_message,
-    list_inbox,
+    list_inbox_with_unread,
     list_sent,
     mark_message_read,
     get_message,
@@ -62,12 +71,18 @@ except Exception as e:
 
 FS_ROOT = Path(config.FS_ROOT).resolve() if getattr(config, "FS_ROOT", None) else None
 SECRET_KEY = getattr(config, "SECRET_KEY", "dev-local-secret-key")
-ALLOWED_EXTENSIONS = set(getattr(config, "ALLOWED_EXTENSIONS", []))
+ALLOWED_EXTENSIONS = frozenset(getattr(config, "ALLOWED_EXTENSIONS", ()))
+# Copy uploads to disk in 1 MiB chunks rather than Werkzeug's 16 KiB default.
+UPLOAD_BUFFER_SIZE = 1 << 20
+# Browser cache lifetime for files served out of FS_ROOT; ETag and
+# Last-Modified still turn later revalidations into 304s.
+FILE_CACHE_MAX_AGE = 3600
 
 POSTFIX_PREFILL_FILE = settings_manager.paths.config_dir / "postfix.json"
 
 SESSION_TIMEOUT = timedelta(minutes=10)
 SESSION_ACTIVITY_KEY = "last_activity"
+SESSION_ACTIVITY_REFRESH = timedelta(seconds=60)
 
 
 CASE_LAW_ROOT_NAME = "Case Law"
@@ -86,10 +101,30 @@ CASE_LAW_CASE_TYPES = {
         "Trademark", "Copyright", "Patent", "Banking", "Others"
     ],
 }
+# Case-insensitive lookups (lowercased name -> canonical name) for validation;
+# the tuple and lists above stay as the ordered sources for the UI.
+_CASE_LAW_PRIMARY_LOOKUP = {option.lower(): option for option in CASE_LAW_PRIMARY_TYPES}
+_CASE_LAW_TYPE_LOOKUP = {
+    primary: {option.lower(): option for option in options}
+    for primary, options in CASE_LAW_CASE_TYPES.items()
+}
+
+
+# Deletes every ASCII character outside [a-zA-Z0-9_-]; non-ASCII is dropped by
+# the encode step, so the two together match the old regex allow-list.
+_FILENAME_FRAGMENT_TABLE = {
+    code: None
+    for code in range(128)
+    if not (chr(code).isalnum() or chr(code) in "_-")
+}
+_DIGITS_RE = re.compile(r"\D")
+_SAFE_NAME_RE = re.compile(r"[^a-zA-Z0-9_-]")
 
 
 def _sanitize_filename_fragment(value: str) -> str:
-    return re.sub(r"[^a-zA-Z0-9_-]+", "", (value or "").strip().replace(" ", "-")).lower()
+    text = (value or "").strip().replace(" ", "-")
+    text = text.encode("ascii", "ignore").decode("ascii")
+    return text.translate(_FILENAME_FRAGMENT_TABLE).lower()
 
 
 def _build_invoice_filename(invoice: Dict[str, Any]) -> str:
@@ -105,30 +140,51 @@ def _build_invoice_filename(invoice: Dict[str, Any]) -> str:
     return base
 
 
-def generate_invoice_pdf(invoice: Dict[str, Any]) -> tuple[BytesIO, str]:
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+except ImportError as exc:  # pragma: no cover - dependency guard
+    _REPORTLAB_IMPORT_ERROR: Optional[ImportError] = exc
+else:
+    _REPORTLAB_IMPORT_ERROR = None
+
+
+TWO_PLACES = Decimal("0.01")
+
+
+def as_decimal(value: Any, default: Decimal = Decimal("0")) -> Decimal:
+    if isinstance(value, Decimal):
+        return value
+    if value in (None, "", False):
+        return default
+    if isinstance(value, int) and not isinstance(value, bool):
+        return Decimal(value)
     try:
-        from reportlab.lib import colors
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
-        from reportlab.lib.units import mm
-        from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
-    except ImportError as exc:  # pragma: no cover - dependency guard
-        raise RuntimeError(
-            "ReportLab is required to generate invoices. Install it with `pip install reportlab`."
-        ) from exc
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError, TypeError):
+        return default
 
-    pdf_buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        pdf_buffer,
-        pagesize=A4,
-        leftMargin=18 * mm,
-        rightMargin=18 * mm,
-        topMargin=24 * mm,
-        bottomMargin=20 * mm,
-        title=f"Invoice {invoice.get('invoice_number') or ''}".strip() or "Invoice",
-    )
+
+def money_text(amount: Decimal) -> str:
+    quantized = amount.quantize(TWO_PLACES)
+    return f"{quantized:,}"
+
+
+def _build_invoice_styles() -> Dict[str, Any]:
+    """Build the invoice page geometry, paragraph styles and table layout once per process."""
+    margins = {
+        "leftMargin": 18 * mm,
+        "rightMargin": 18 * mm,
+        "topMargin": 24 * mm,
+        "bottomMargin": 20 * mm,
+    }
+    frame_width = A4[0] - margins["leftMargin"] - margins["rightMargin"]
     AVAILABLE_MARGIN = 24  # ensure tables stay comfortably within the frame
-    available_width = max(doc.width - AVAILABLE_MARGIN, doc.width * 0.9)
+    available_width = max(frame_width - AVAILABLE_MARGIN, frame_width * 0.9)
 
     styles = getSampleStyleSheet()
     title_style = styles["Title"].clone("InvoiceTitle")
@@ -136,56 +192,126 @@ def generate_invoice_pdf(invoice: Dict[str, Any]) -> tuple[BytesIO, str]:
     title_style.leading = 26
     title_style.alignment = 0
 
-    meta_block_style = ParagraphStyle(
-        "InvoiceMetaBlock",
-        parent=styles["Normal"],
-        fontSize=11,
-        leading=14,
-        alignment=2,
-        leftIndent=available_width * 0.55,
-    )
     party_style = ParagraphStyle("InvoiceParty", parent=styles["Normal"], fontSize=10, leading=14)
-    party_style_right = ParagraphStyle(
-        "InvoicePartyRight", parent=party_style, alignment=2  # right-align
-    )
-    table_header_style = ParagraphStyle(
-        "InvoiceHeader",
-        parent=styles["Normal"],
-        fontSize=10,
-        leading=13,
-        alignment=1,
-        textColor=colors.whitesmoke,
-        spaceAfter=4,
-    )
-    table_cell_style = ParagraphStyle("InvoiceCell", parent=styles["Normal"], fontSize=10, leading=13)
-    money_style = ParagraphStyle(
-        "InvoiceMoney", parent=styles["Normal"], fontSize=10, leading=13, alignment=2
-    )
-    total_label_style = ParagraphStyle(
-        "InvoiceTotalLabel", parent=styles["Normal"], fontSize=10, leading=13, alignment=2
-    )
+    return {
+        "margins": margins,
+        "title_style": title_style,
+        "meta_block_style": ParagraphStyle(
+            "InvoiceMetaBlock",
+            parent=styles["Normal"],
+            fontSize=11,
+            leading=14,
+            alignment=2,
+            leftIndent=available_width * 0.55,
+        ),
+        "party_style": party_style,
+        "party_style_right": ParagraphStyle(
+            "InvoicePartyRight", parent=party_style, alignment=2  # right-align
+        ),
+        "table_header_style": ParagraphStyle(
+            "InvoiceHeader",
+            parent=styles["Normal"],
+            fontSize=10,
+            leading=13,
+            alignment=1,
+            textColor=colors.whitesmoke,
+            spaceAfter=4,
+        ),
+        "table_cell_style": ParagraphStyle(
+            "InvoiceCell", parent=styles["Normal"], fontSize=10, leading=13
+        ),
+        "money_style": ParagraphStyle(
+            "InvoiceMoney", parent=styles["Normal"], fontSize=10, leading=13, alignment=2
+        ),
+        "total_label_style": ParagraphStyle(
+            "InvoiceTotalLabel", parent=styles["Normal"], fontSize=10, leading=13, alignment=2
+        ),
+        "party_col_widths": [available_width * 0.55, available_width * 0.45],
+        "parties_table_style": TableStyle(
+            [
+                ("VALIGN", (0, 0), (-1, -1), "TOP"),
+                ("LEFTPADDING", (0, 0), (-1, -1), 0),
+                ("RIGHTPADDING", (0, 0), (-1, -1), 0),
+                ("TOPPADDING", (0, 0), (-1, -1), 0),
+                ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
+                ("ALIGN", (1, 0), (1, 0), "RIGHT"),
+            ]
+        ),
+        "item_col_widths": [
+            available_width * 0.12,
+            available_width * 0.24,
+            available_width * 0.38,
+            available_width * 0.26,
+        ],
+        # Text width left in each item column once cell padding is removed.
+        "item_text_widths": [
+            available_width * share - 8 for share in (0.12, 0.24, 0.38, 0.26)
+        ],
+        "items_table_style": TableStyle(
+            [
+                ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1f2937")),
+                ("LINEBELOW", (0, 0), (-1, 0), 1, colors.black),
+                ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+                ("ALIGN", (3, 0), (3, -1), "RIGHT"),
+                ("VALIGN", (0, 0), (-1, -1), "TOP"),
+                ("INNERGRID", (0, 0), (-1, -1), 0.25, colors.lightgrey),
+                ("BOX", (0, 0), (-1, -1), 0.5, colors.lightgrey),
+                ("BACKGROUND", (0, -1), (-1, -1), colors.HexColor("#f3f4f6")),
+                ("FONT", (0, 1), (-1, -1), "Helvetica", 10, 13),
+                ("LEFTPADDING", (0, 0), (-1, -1), 4),
+                ("RIGHTPADDING", (0, 0), (-1, -1), 4),
+                ("TOPPADDING", (0, 0), (-1, -1), 4),
+                ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
+            ]
+        ),
+    }
 
-    TWO_PLACES = Decimal("0.01")
 
-    def as_decimal(value: Any, default: Decimal = Decimal("0")) -> Decimal:
-        if value in (None, "", False):
-            return default
-        try:
-            return Decimal(str(value))
-        except (InvalidOperation, ValueError, TypeError):
-            return default
+_INVOICE_STYLES: Dict[str, Any] = (
+    _build_invoice_styles() if _REPORTLAB_IMPORT_ERROR is None else {}
+)
+
+INVOICE_RENDER_TIMEOUT_SECONDS = 30
+INVOICE_BATCH_LIMIT = 50
+_PDF_EXECUTOR = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 2, thread_name_prefix="caseorg-invoice-pdf"
+)
+
+
+def generate_invoice_pdf(invoice: Dict[str, Any]) -> tuple[BytesIO, str]:
+    if _REPORTLAB_IMPORT_ERROR is not None:  # pragma: no cover - dependency guard
+        raise RuntimeError(
+            "ReportLab is required to generate invoices. Install it with `pip install reportlab`."
+        ) from _REPORTLAB_IMPORT_ERROR
 
-    def money_text(amount: Decimal) -> str:
-        quantized = amount.quantize(TWO_PLACES)
-        return f"{quantized:,}"
+    title_style = _INVOICE_STYLES["title_style"]
+    meta_block_style = _INVOICE_STYLES["meta_block_style"]
+    party_style = _INVOICE_STYLES["party_style"]
+    party_style_right = _INVOICE_STYLES["party_style_right"]
+    table_header_style = _INVOICE_STYLES["table_header_style"]
+    table_cell_style = _INVOICE_STYLES["table_cell_style"]
+    money_style = _INVOICE_STYLES["money_style"]
+    total_label_style = _INVOICE_STYLES["total_label_style"]
+
+    pdf_buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        pdf_buffer,
+        pagesize=A4,
+        title=f"Invoice {invoice.get('invoice_number') or ''}".strip() or "Invoice",
+        **_INVOICE_STYLES["margins"],
+    )
 
     raw_items = invoice.get("items") or []
     processed_items: list[dict[str, Any]] = []
-    sum_from_items = Decimal("0")
+    _D = Decimal
+    _Q = TWO_PLACES
+    zero = _D(0)
+    sum_from_items = zero
     for row in raw_items:
         if not isinstance(row, dict):
             continue
-        amount = as_decimal(row.get("amount"))
+        raw = row.get("amount")
+        amount = raw if isinstance(raw, _D) else as_decimal(raw, zero)
         sum_from_items += amount
         processed_items.append(
             {
@@ -193,7 +319,7 @@ def generate_invoice_pdf(invoice: Dict[str, Any]) -> tuple[BytesIO, str]:
                 "item": row.get("item") or "",
                 "description": row.get("description") or "",
                 "amount": amount,
-                "amount_display": money_text(amount),
+                "amount_display": format(amount.quantize(_Q), ","),
             }
         )
 
@@ -223,7 +349,6 @@ def generate_invoice_pdf(invoice: Dict[str, Any]) -> tuple[BytesIO, str]:
         style = party_style_right if alignment == "right" else party_style
         return Paragraph(f"<b>{heading}</b><br/>{body}", style)
 
-    party_col_widths = [available_width * 0.55, available_width * 0.45]
     parties_table = Table(
         [
             [
@@ -231,20 +356,9 @@ def generate_invoice_pdf(invoice: Dict[str, Any]) -> tuple[BytesIO, str]:
                 format_party("To", invoice.get("recipient_lines") or [], alignment="right"),
             ]
         ],
-        colWidths=party_col_widths,
-    )
-    parties_table.setStyle(
-        TableStyle(
-            [
-                ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                ("LEFTPADDING", (0, 0), (-1, -1), 0),
-                ("RIGHTPADDING", (0, 0), (-1, -1), 0),
-                ("TOPPADDING", (0, 0), (-1, -1), 0),
-                ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
-                ("ALIGN", (1, 0), (1, 0), "RIGHT"),
-            ]
-        )
+        colWidths=_INVOICE_STYLES["party_col_widths"],
     )
+    parties_table.setStyle(_INVOICE_STYLES["parties_table_style"])
     story.append(parties_table)
     story.append(Spacer(1, 18))
 
@@ -257,65 +371,45 @@ def generate_invoice_pdf(invoice: Dict[str, Any]) -> tuple[BytesIO, str]:
         ]
     ]
 
+    text_widths = _INVOICE_STYLES["item_text_widths"]
+
+    def item_cell(text: str, column: int):
+        # Plain strings are drawn directly in the table font; only text that
+        # needs wrapping goes through the Paragraph parser, escaped so that
+        # user text is never read as markup.
+        if "\n" in text or stringWidth(text, "Helvetica", 10) > text_widths[column]:
+            style = money_style if column == 3 else table_cell_style
+            return Paragraph(text.translate(_SAFE_TEXT_TABLE), style)
+        return text
+
     if processed_items:
         for row in processed_items:
             table_data.append(
                 [
-                    Paragraph(row.get("sn") or "", table_cell_style),
-                    Paragraph(row.get("item") or "", table_cell_style),
-                    Paragraph(row.get("description") or "", table_cell_style),
-                    Paragraph(row.get("amount_display") or "", money_style),
+                    item_cell(row.get("sn") or "", 0),
+                    item_cell(row.get("item") or "", 1),
+                    item_cell(row.get("description") or "", 2),
+                    item_cell(row.get("amount_display") or "", 3),
                 ]
             )
     else:
-        table_data.append(
-            [
-                Paragraph("", table_cell_style),
-                Paragraph("", table_cell_style),
-                Paragraph("No line items recorded", table_cell_style),
-                Paragraph("", money_style),
-            ]
-        )
+        table_data.append(["", "", "No line items recorded", ""])
 
     table_data.append(
         [
-            Paragraph("", table_cell_style),
-            Paragraph("", table_cell_style),
+            "",
+            "",
             Paragraph("<b>Total</b>", total_label_style),
-            Paragraph(total_display, money_style),
+            item_cell(total_display, 3),
         ]
     )
 
-    item_col_widths = [
-        available_width * 0.12,
-        available_width * 0.24,
-        available_width * 0.38,
-        available_width * 0.26,
-    ]
     items_table = Table(
         table_data,
-        colWidths=item_col_widths,
+        colWidths=_INVOICE_STYLES["item_col_widths"],
         repeatRows=1,
     )
-    items_table.setStyle(
-        TableStyle(
-            [
-                ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1f2937")),
-                ("LINEBELOW", (0, 0), (-1, 0), 1, colors.black),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-                ("ALIGN", (0, 0), (0, -1), "CENTER"),
-                ("ALIGN", (3, 0), (3, -1), "RIGHT"),
-                ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                ("INNERGRID", (0, 0), (-1, -1), 0.25, colors.lightgrey),
-                ("BOX", (0, 0), (-1, -1), 0.5, colors.lightgrey),
-                ("BACKGROUND", (0, -1), (-1, -1), colors.HexColor("#f3f4f6")),
-                ("LEFTPADDING", (0, 0), (-1, -1), 4),
-                ("RIGHTPADDING", (0, 0), (-1, -1), 4),
-                ("TOPPADDING", (0, 0), (-1, -1), 4),
-                ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-            ]
-        )
-    )
+    items_table.setStyle(_INVOICE_STYLES["items_table_style"])
 
     story.append(items_table)
     story.append(Spacer(1, 12))
@@ -325,13 +419,18 @@ def generate_invoice_pdf(invoice: Dict[str, Any]) -> tuple[BytesIO, str]:
     filename = _build_invoice_filename(invoice)
     return pdf_buffer, filename
 
+
+def generate_invoice_pdf_async(invoice: Dict[str, Any]) -> Future:
+    """Queue an invoice render on the bounded PDF pool and return its future."""
+    return _PDF_EXECUTOR.submit(generate_invoice_pdf, invoice)
+
+
+_SAFE_TEXT_TABLE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
+
 def safe_text(value: Any) -> str:
     text = str(value or "").strip() or "—"
-    return (
-        text.replace("&", "&amp;")
-            .replace("<", "&lt;")
-            .replace(">", "&gt;")
-    )
+    return text.translate(_SAFE_TEXT_TABLE)
 
 INVOICE_NUMBER_PAD = 5
 
@@ -351,7 +450,10 @@ def _format_invoice_number_value(value: int) -> str:
 def _parse_invoice_number(raw: Optional[str]) -> Optional[int]:
     if not raw:
         return None
-    digits = re.sub(r"\D", "", raw)
+    if raw.isdecimal():
+        # Auto-assigned numbers are plain digits; skip the regex entirely.
+        return int(raw)
+    digits = _DIGITS_RE.sub("", raw)
     if not digits:
         return None
     try:
@@ -360,46 +462,43 @@ def _parse_invoice_number(raw: Optional[str]) -> Optional[int]:
         return None
 
 
-def _get_invoice_counter(conn: sqlite3.Connection) -> int:
-    row = conn.execute(
-        "SELECT value FROM app_settings WHERE key = ?", ("invoice_next_number",)
-    ).fetchone()
-    if not row:
-        return 1
+_SQL_GET_COUNTER = "SELECT value FROM app_settings WHERE key = ?"
+_SQL_COUNTER_AND_MAX = """
+    SELECT
+        (SELECT value FROM app_settings WHERE key = 'invoice_next_number') AS counter,
+        (SELECT MAX(invoice_number_int) FROM invoices) AS highest
+"""
+_SQL_UPSERT_COUNTER = """
+    INSERT INTO app_settings(key, value, protected)
+    VALUES('invoice_next_number', ?, 0)
+    ON CONFLICT(key) DO UPDATE SET value = excluded.value
+"""
+
+
+def _coerce_invoice_counter(raw: Any) -> int:
     try:
-        value = int(row["value"])
+        value = int(raw)
     except (TypeError, ValueError):
         value = 1
     return max(value, 1)
 
 
+def _get_invoice_counter(conn: sqlite3.Connection) -> int:
+    row = conn.execute(_SQL_GET_COUNTER, ("invoice_next_number",)).fetchone()
+    return _coerce_invoice_counter(row["value"]) if row else 1
+
+
 def _set_invoice_counter(conn: sqlite3.Connection, value: int) -> None:
     value = max(int(value), 1)
-    conn.execute(
-        """
-        INSERT INTO app_settings(key, value, protected)
-        VALUES('invoice_next_number', ?, 0)
-        ON CONFLICT(key) DO UPDATE SET value = excluded.value
-        """,
-        (str(value),),
-    )
+    conn.execute(_SQL_UPSERT_COUNTER, (str(value),))
 
 
 def _compute_next_invoice_number(conn: sqlite3.Connection) -> int:
-    counter = _get_invoice_counter(conn)
-    row = conn.execute(
-        """
-        SELECT invoice_number
-        FROM invoices
-        WHERE invoice_number GLOB '[0-9]*'
-        ORDER BY CAST(invoice_number AS INTEGER) DESC
-        LIMIT 1
-        """
-    ).fetchone()
-    if row:
-        highest = _parse_invoice_number(row["invoice_number"])
-        if highest is not None and highest >= counter:
-            counter = highest + 1
+    row = conn.execute(_SQL_COUNTER_AND_MAX).fetchone()
+    counter = _coerce_invoice_counter(row["counter"])
+    highest = row["highest"]
+    if highest is not None and highest >= counter:
+        counter = highest + 1
     return counter
 
 
@@ -408,6 +507,10 @@ def _suggest_invoice_number(conn: sqlite3.Connection) -> str:
 
 
 def _reserve_invoice_number(conn: sqlite3.Connection) -> str:
+    # Take the write lock before reading so concurrent saves cannot both
+    # observe the same counter value; the caller's ``with conn`` commits.
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
     next_value = _compute_next_invoice_number(conn)
     _set_invoice_counter(conn, next_value + 1)
     return _format_invoice_number_value(next_value)
@@ -448,25 +551,17 @@ def _invoice_target_path(
     else:
         case_invoices_dir = None
 
-    safe_number = re.sub(r"[^a-zA-Z0-9_-]", "_", invoice_number).strip("_") or "invoice"
+    safe_number = _SAFE_NAME_RE.sub("_", invoice_number).strip("_") or "invoice"
     base_filename = f"Invoice_{safe_number}"
 
     def choose_filename() -> str:
-        attempt = 0
-        while True:
-            if attempt == 0:
-                candidate = f"{base_filename}.pdf"
-            elif attempt == 1:
-                ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-                candidate = f"{base_filename}_{ts}.pdf"
-            else:
-                ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-                candidate = f"{base_filename}_{ts}_{secrets.token_hex(2)}.pdf"
-            primary_exists = (main_invoices_dir / candidate).exists()
-            case_exists = bool(case_invoices_dir and (case_invoices_dir / candidate).exists())
-            if not primary_exists and not case_exists:
-                return candidate
-            attempt += 1
+        candidate = f"{base_filename}.pdf"
+        if (main_invoices_dir / candidate).exists() or (
+            case_invoices_dir and (case_invoices_dir / candidate).exists()
+        ):
+            # A random suffix is effectively collision-free, so skip re-checking.
+            candidate = f"{base_filename}_{secrets.token_hex(4)}.pdf"
+        return candidate
 
     final_filename = choose_filename()
     primary_path = main_invoices_dir / final_filename
@@ -474,6 +569,92 @@ def _invoice_target_path(
     return primary_path, case_path
 
 
+def _write_invoice_copies(data: Any, paths: Iterable[Path]) -> None:
+    """Write ``data`` to each path from one shared view of the PDF bytes.
+
+    If any write fails, every file already created is removed and the error
+    re-raised.
+    """
+    written: list[Path] = []
+    # Release the view even on failure: a traceback keeping it alive would
+    # leave the caller's buffer exported and impossible to resize.
+    with memoryview(data) as view:
+        try:
+            for path in paths:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+                written.append(path)
+                try:
+                    offset = 0
+                    while offset < len(view):
+                        with view[offset:] as chunk:
+                            offset += os.write(fd, chunk)
+                finally:
+                    os.close(fd)
+        except OSError:
+            for path in written:
+                with suppress(FileNotFoundError):
+                    path.unlink()
+            raise
+
+
+def _store_rendered_invoice(
+    render: Future,
+    invoice: Dict[str, Any],
+    case_year: Optional[str],
+    case_month: Optional[str],
+    case_name: Optional[str],
+) -> tuple[Path, Optional[Path]]:
+    """Wait for ``render`` and write the PDF to the invoices folder (and case copy)."""
+    try:
+        pdf_buffer, _ = render.result(
+            timeout=INVOICE_RENDER_TIMEOUT_SECONDS
+        )
+    except FutureTimeout as exc:
+        raise InvoiceStorageError("Timed out while rendering the invoice.") from exc
+    except RuntimeError:
+        # Missing ReportLab and similar setup errors; callers answer 503.
+        raise
+    except Exception as exc:
+        raise InvoiceStorageError(f"Failed to render invoice: {exc}") from exc
+
+    try:
+        primary_path, case_copy_path = _invoice_target_path(
+            invoice["invoice_number"], case_year, case_month, case_name
+        )
+        with pdf_buffer.getbuffer() as pdf_view:
+            _write_invoice_copies(
+                pdf_view,
+                [primary_path, case_copy_path] if case_copy_path else [primary_path],
+            )
+    except OSError as exc:
+        raise InvoiceStorageError(f"Unable to write invoice PDF: {exc}") from exc
+    return primary_path, case_copy_path
+
+
+def _invoice_relative_path(path: Path) -> str:
+    try:
+        return str(path.relative_to(FS_ROOT)) if FS_ROOT else str(path)
+    except Exception:
+        return str(path)
+
+
+def _invoice_record_json(
+    invoice: Dict[str, Any],
+    case_year: Optional[str],
+    case_month: Optional[str],
+    case_name: Optional[str],
+) -> str:
+    record = dict(invoice)
+    record.update(
+        {
+            "case_year": case_year,
+            "case_month": case_month,
+            "case_name": case_name,
+        }
+    )
+    return _json_dumps_text(record)
+
+
 def _insert_invoice_row(
     conn: sqlite3.Connection,
     invoice_number: str,
@@ -494,9 +675,10 @@ def _insert_invoice_row(
                 case_name,
                 file_path,
                 payload_json,
-                generated_by
+                generated_by,
+                invoice_number_int
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (
                 invoice_number,
@@ -506,6 +688,7 @@ def _insert_invoice_row(
                 relative_path,
                 payload_json,
                 user_id,
+                _parse_invoice_number(invoice_number) if invoice_number[:1].isdigit() else None,
             ),
         )
     except sqlite3.IntegrityError as exc:
@@ -514,166 +697,108 @@ def _insert_invoice_row(
         raise
 
 
+def _release_invoice_rows(
+    conn: sqlite3.Connection,
+    invoice_numbers: Iterable[str],
+    counter_before: int,
+    counter_after: int,
+) -> None:
+    """Undo a reservation whose PDFs could not be produced.
+
+    The rows are deleted and the counter moved back to ``counter_before``
+    unless another save has since reserved past ``counter_after``.
+    """
+    with suppress(sqlite3.Error), conn:
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            "DELETE FROM invoices WHERE invoice_number = ?",
+            [(number,) for number in invoice_numbers],
+        )
+        if _get_invoice_counter(conn) == counter_after:
+            _set_invoice_counter(conn, counter_before)
+
+
 def _clean_lines(values: Any) -> list[str]:
-    lines: list[str] = []
     if not isinstance(values, list):
-        return lines
-    for item in values:
-        text = str(item or "").strip()
-        if text:
-            lines.append(text)
-    return lines
+        return []
+    return [text for text in (str(item or "").strip() for item in values) if text]
 
-    raw_items = invoice.get("items") or []
-    processed_items: list[dict[str, Any]] = []
-    sum_from_items = Decimal("0")
-    for row in raw_items:
-        if not isinstance(row, dict):
-            continue
-        amount = as_decimal(row.get("amount"))
-        sum_from_items += amount
-        processed_items.append(
-            {
-                "sn": str(row.get("sn") or ""),
-                "item": row.get("item") or "",
-                "description": row.get("description") or "",
-                "amount": amount,
-                "amount_display": money_text(amount),
-            }
-        )
 
-    requested_total = as_decimal(invoice.get("total"), sum_from_items if processed_items else Decimal("0"))
-    if processed_items and requested_total == Decimal("0") and sum_from_items > Decimal("0"):
-        requested_total = sum_from_items
-    total_display = money_text(requested_total)
+# (payload key, maximum length) for the free-text invoice and line-item fields.
+_INVOICE_TEXT_FIELDS = (("invoice_date", 120), ("client_name", 180))
+_INVOICE_ITEM_FIELDS = (("sn", 40), ("item", 160), ("description", 600))
 
-    story: list = []
 
-    story.append(Paragraph("INVOICE", title_style))
-    story.append(Spacer(1, 6))
+def _clip_fields(source: Dict[str, Any], fields: Iterable[tuple[str, int]]) -> Dict[str, str]:
+    return {key: str(source.get(key) or "").strip()[:limit] for key, limit in fields}
 
-    meta_block_html = (
-        "<font size=9><b>Invoice #</b></font><br/>"
-        f"{safe_text(invoice.get('invoice_number'))}<br/><br/>"
-        "<font size=9><b>Date</b></font><br/>"
-        f"{safe_text(invoice.get('invoice_date'))}"
+
+def _invoice_case_fields(payload: Dict[str, Any]) -> tuple[str, str, str]:
+    return (
+        (payload.get("case_year") or "").strip(),
+        (payload.get("case_month") or "").strip(),
+        (payload.get("case_name") or "").strip(),
     )
-    story.append(Paragraph(meta_block_html, meta_block_style))
-    story.append(Spacer(1, 18))
 
-    def format_party(heading: str, lines, alignment: str = "left"):
-        body = "<br/>".join(lines) if lines else "—"
-        style = party_style_right if alignment == "right" else party_style
-        return Paragraph(f"<b>{heading}</b><br/>{body}", style)
 
-    party_col_widths = [available_width * 0.55, available_width * 0.45]
-    parties_table = Table(
-        [
-            [
-                format_party("From", invoice.get("issuer_lines") or []),
-                format_party("To", invoice.get("recipient_lines") or [], alignment="right"),
-            ]
-        ],
-        colWidths=party_col_widths,
-    )
-    parties_table.setStyle(
-        TableStyle(
-            [
-                ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                ("LEFTPADDING", (0, 0), (-1, -1), 0),
-                ("RIGHTPADDING", (0, 0), (-1, -1), 0),
-                ("TOPPADDING", (0, 0), (-1, -1), 0),
-                ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
-                ("ALIGN", (1, 0), (1, 0), "RIGHT"),
-            ]
-        )
-    )
-    story.append(parties_table)
-    story.append(Spacer(1, 18))
+def _invoice_data_from_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalise a submitted invoice into the dict rendered and stored."""
+    invoice_data: Dict[str, Any] = {
+        "invoice_number": str(payload.get("invoice_number") or "").strip(),
+        **_clip_fields(payload, _INVOICE_TEXT_FIELDS),
+        "issuer_lines": _clean_lines(payload.get("issuer_lines") or []),
+        "recipient_lines": _clean_lines(payload.get("recipient_lines") or []),
+        "generated_at": payload.get("generated_at") or datetime.utcnow().isoformat(),
+    }
 
-    table_data = [
-        [
-            Paragraph("S/N", table_header_style),
-            Paragraph("Item", table_header_style),
-            Paragraph("Description", table_header_style),
-            Paragraph("Amount", table_header_style),
-        ]
-    ]
+    items: list[dict[str, Any]] = []
+    zero = Decimal("0")
+    computed_total = zero
+    for row in payload.get("items") or []:
+        if not isinstance(row, dict):
+            continue
+        amount_decimal = as_decimal(row.get("amount"))
+        computed_total += amount_decimal
+        cleaned = _clip_fields(row, _INVOICE_ITEM_FIELDS)
+        cleaned["amount"] = str(amount_decimal.quantize(TWO_PLACES))
+        if any(cleaned.values()):
+            items.append(cleaned)
+    invoice_data["items"] = items
 
-    if processed_items:
-        for row in processed_items:
-            table_data.append(
-                [
-                    Paragraph(row.get("sn") or "", table_cell_style),
-                    Paragraph(row.get("item") or "", table_cell_style),
-                    Paragraph(row.get("description") or "", table_cell_style),
-                    Paragraph(row.get("amount_display") or "", money_style),
-                ]
-            )
-    else:
-        table_data.append(
-            [
-                Paragraph("", table_cell_style),
-                Paragraph("", table_cell_style),
-                Paragraph("No line items recorded", table_cell_style),
-                Paragraph("", table_cell_style),
-            ]
-        )
+    requested_total = as_decimal(payload.get("total"), computed_total if items else zero)
+    if items and requested_total == zero and computed_total > zero:
+        requested_total = computed_total
+    invoice_data["total"] = str(requested_total.quantize(TWO_PLACES))
+    return invoice_data
 
-    table_data.append(
-        [
-            Paragraph("", table_cell_style),
-            Paragraph("", table_cell_style),
-            Paragraph("<b>Total</b>", total_label_style),
-            Paragraph(total_display, money_style),
-        ]
-    )
 
-    item_col_widths = [
-        available_width * 0.12,
-        available_width * 0.24,
-        available_width * 0.38,
-        available_width * 0.26,
-    ]
-    items_table = Table(
-        table_data,
-        colWidths=item_col_widths,
-        repeatRows=1,
-    )
-    items_table.setStyle(
-        TableStyle(
-            [
-                ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1f2937")),
-                ("LINEBELOW", (0, 0), (-1, 0), 1, colors.black),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-                ("ALIGN", (0, 0), (0, -1), "CENTER"),
-                ("ALIGN", (3, 0), (3, -1), "RIGHT"),
-                ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                ("INNERGRID", (0, 0), (-1, -1), 0.25, colors.lightgrey),
-                ("BOX", (0, 0), (-1, -1), 0.5, colors.lightgrey),
-                ("BACKGROUND", (0, -1), (-1, -1), colors.HexColor("#f3f4f6")),
-                ("LEFTPADDING", (0, 0), (-1, -1), 4),
-                ("RIGHTPADDING", (0, 0), (-1, -1), 4),
-                ("TOPPADDING", (0, 0), (-1, -1), 4),
-                ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-            ]
-        )
-    )
+def _form_text(form: Any, key: str, default: str = "") -> str:
+    return (form.get(key) or default).strip()
 
-    story.append(items_table)
-    story.append(Spacer(1, 12))
 
-    doc.build(story)
+def _form_int(form: Any, key: str, default: int = 0) -> int:
+    try:
+        return int(form.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# Setup never becomes incomplete again once finished (users are deactivated,
+# not deleted), so after the first positive check no further queries are made.
+_setup_complete_cached = False
 
-    pdf_buffer.seek(0)
-    filename = _build_invoice_filename(invoice)
-    return pdf_buffer, filename
 
 def is_initial_setup_complete() -> bool:
+    global _setup_complete_cached
+    if _setup_complete_cached:
+        return True
     try:
-        return bool(config.FS_ROOT) and count_users() > 0
+        complete = bool(config.FS_ROOT) and count_users() > 0
     except Exception:
         return False
+    _setup_complete_cached = complete
+    return complete
 
 
 def login_user_session(user: sqlite3.Row) -> None:
@@ -742,22 +867,112 @@ def require_admin_api(handler):
 app = Flask(__name__)
 app.secret_key = SECRET_KEY
 app.permanent_session_lifetime = SESSION_TIMEOUT
+# Only re-issue the session cookie when it changes; _enforce_session_timeout
+# touches it at most once per SESSION_ACTIVITY_REFRESH.
+app.config["SESSION_REFRESH_EACH_REQUEST"] = False
+
+# Minimal pages served when a styled template file is missing. They sit behind
+# the regular loader, so Jinja compiles and caches whichever one is found and
+# routes can call render_template directly.
+_FALLBACK_TEMPLATES: Dict[str, str] = {
+    "login.html": """
+        <!doctype html><title>Login</title>
+        <h1>Case Organizer</h1>
+        <form method="post">
+          <input name="email" type="email" placeholder="Email" value="{{ email }}" required>
+          <input name="password" type="password" placeholder="Password" required>
+          <button>Sign In</button>
+        </form>
+        <p><a href="{{ url_for('forgot_password') }}">Forgot your password?</a></p>
+    """,
+    "forgot_password.html": """
+        <!doctype html><title>Forgot Password</title>
+        <h1>Reset your password</h1>
+        <form method="post">
+          <input name="email" type="email" placeholder="Email" required>
+          <button>Send reset link</button>
+        </form>
+        <p><a href="{{ url_for('login') }}">Back to login</a></p>
+    """,
+    "reset_password.html": """
+        <!doctype html><title>Reset Password</title>
+        <h1>Choose a new password</h1>
+        <form method="post">
+          <input name="password" type="password" placeholder="New password" required>
+          <input name="password2" type="password" placeholder="Confirm password" required>
+          <button>Update password</button>
+        </form>
+        <p><a href="{{ url_for('login') }}">Back to login</a></p>
+    """,
+    "index.html": """
+        <!doctype html><title>Home</title>
+        <h1>Home (fallback)</h1>
+        {% if current_user %}
+          <p>Logged in as: {{ current_user.email }}</p>
+        {% else %}
+          <p>You are not signed in.</p>
+        {% endif %}
+        <p><a href="{{ url_for('logout') }}">Logout</a></p>
+    """,
+    "account.html": """
+        <!doctype html><title>My Account</title>
+        <h1>My Account</h1>
+        <p>Email: {{ current_user.email }}</p>
+    """,
+    "invoice.html": """
+        <!doctype html><title>Generate Invoice</title>
+        <h1>Invoice Generator</h1>
+        <p>Unable to load the styled template. Please contact support.</p>
+    """,
+    "messages.html": """
+        <!doctype html><title>Messages</title>
+        <h1>Messages</h1>
+        <p>This feature requires HTML templates. Inbox entries: {{ inbox|length }}</p>
+    """,
+    "message_detail.html": """
+        <!doctype html><title>Message</title>
+        <h1>{{ message.subject or 'No subject' }}</h1>
+        <p>From: {{ message.sender_email }} | To: {{ message.recipient_email }}</p>
+        <pre>{{ message.body }}</pre>
+    """,
+    "settings.html": """
+        <!doctype html><title>Settings</title>
+        <h1>Admin Settings (fallback)</h1>
+        <p>Storage root: {{ fs_root }}</p>
+        <p>SMTP host: {{ smtp.host }}</p>
+    """,
+}
+app.jinja_env.loader = ChoiceLoader(
+    [app.jinja_env.loader, DictLoader(_FALLBACK_TEMPLATES)]
+)
 
 print("Running app.py from:", os.path.abspath(__file__))
 print("FS_ROOT:", FS_ROOT)
 
 # ---- Utilities ----------------------------------------------------------
+# Directories and case-law databases already prepared by this process, keyed by
+# path so a storage root changed through setup/settings is still prepared.
+_ensured_dirs: set[Path] = set()
+_case_law_schema_ready: set[Path] = set()
+
+
+def _ensure_dir_once(path: Path) -> None:
+    if path not in _ensured_dirs:
+        path.mkdir(parents=True, exist_ok=True)
+        _ensured_dirs.add(path)
+
+
 def ensure_root() -> None:
     """Create the storage root if configured."""
     if FS_ROOT:
-        FS_ROOT.mkdir(parents=True, exist_ok=True)
+        _ensure_dir_once(FS_ROOT)
 
 
 def _case_law_root() -> Path:
     if not FS_ROOT:
         raise RuntimeError("Storage root is not configured yet")
     root = FS_ROOT / CASE_LAW_ROOT_NAME
-    root.mkdir(parents=True, exist_ok=True)
+    _ensure_dir_once(root)
     return root
 
 
@@ -791,6 +1006,10 @@ def _ensure_case_law_schema(conn: sqlite3.Connection) -> None:
         )
         """
     )
+    # SHA-256 of the judgment file, linking each case to its text_cache row.
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(case_law)")}
+    if "text_sha" not in columns:
+        conn.execute("ALTER TABLE case_law ADD COLUMN text_sha TEXT")
     conn.execute(
         """
         CREATE VIRTUAL TABLE IF NOT EXISTS case_law_fts USING fts5(
@@ -803,6 +1022,80 @@ def _ensure_case_law_schema(conn: sqlite3.Connection) -> None:
         )
         """
     )
+    # Case-folder name index for /api/cases/search. The trigram tokenizer lets
+    # substring LIKE queries use the index; case_name_months records each
+    # month folder's mtime so only changed months are re-listed.
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS case_names_fts USING fts5(
+            year UNINDEXED,
+            month UNINDEXED,
+            name UNINDEXED,
+            name_lower,
+            tokenize = 'trigram'
+        )
+        """
+    )
+    # Extracted judgment text keyed by the file's SHA-256, so re-uploading a
+    # judgment already on file skips PDF/DOCX parsing. Rows are pruned when
+    # the last case with that digest is deleted.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS text_cache (
+            sha TEXT PRIMARY KEY,
+            text TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS case_name_months (
+            year TEXT NOT NULL,
+            month TEXT NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            PRIMARY KEY(year, month)
+        )
+        """
+    )
+    # case_law_search always orders by year then upload time; these let the
+    # unfiltered, year-filtered and type-filtered searches walk an index in
+    # that order and stop at LIMIT instead of sorting every matching row.
+    # Party and citation filters are infix LIKEs, which no index can serve.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_case_law_year_created "
+        "ON case_law(decision_year DESC, created_at DESC)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_case_law_type_year_created "
+        "ON case_law(primary_type, subtype, decision_year DESC, created_at DESC)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_case_law_text_sha ON case_law(text_sha)")
+
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def _json_dumps_text(data: Any) -> str:
+    """Serialise to a compact UTF-8 JSON string, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False)
+
+
+def _json_loads(raw: str) -> Any:
+    """Parse JSON with orjson when available; both raise json.JSONDecodeError."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _json_dumps_indented(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode("utf-8")
 
 
 def load_installed_postfix_defaults() -> Dict[str, Any]:
@@ -828,7 +1121,7 @@ def write_postfix_prefill_files(host: str, port: int | str, username: str, passw
     }
     try:
         POSTFIX_PREFILL_FILE.parent.mkdir(parents=True, exist_ok=True)
-        POSTFIX_PREFILL_FILE.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+        POSTFIX_PREFILL_FILE.write_bytes(_json_dumps_indented(payload))
         POSTFIX_PREFILL_FILE.chmod(0o640)
     except Exception:
         pass
@@ -870,19 +1163,45 @@ echo "Postfix relay updated."
 def get_case_law_db() -> sqlite3.Connection:
     if 'case_law_db' not in g:
         path = _case_law_db_file()
-        conn = sqlite3.connect(path)
-        conn.row_factory = sqlite3.Row
-        conn.execute('PRAGMA foreign_keys = ON')
-        _ensure_case_law_schema(conn)
+        conn = connect_sqlite(path)
+        if path not in _case_law_schema_ready:
+            _ensure_case_law_schema(conn)
+            _case_law_schema_ready.add(path)
         g.case_law_db = conn
     return g.case_law_db
 
 
+# Distinct decision years offered as a search filter, per case-law database.
+# Only uploads and deletes change them, so they drop the entry.
+_case_law_years: Dict[Path, list[int]] = {}
+_case_law_years_lock = Lock()
+
+
+def case_law_years(conn: sqlite3.Connection) -> list[int]:
+    path = _case_law_db_file()
+    with _case_law_years_lock:
+        years = _case_law_years.get(path)
+        if years is None:
+            years = [
+                r[0]
+                for r in conn.execute(
+                    "SELECT DISTINCT decision_year FROM case_law ORDER BY decision_year DESC"
+                ).fetchall()
+            ]
+            _case_law_years[path] = years
+        return years
+
+
+def invalidate_case_law_years() -> None:
+    with _case_law_years_lock:
+        _case_law_years.pop(_case_law_db_file(), None)
+
+
 @app.teardown_appcontext
 def close_case_law_db(_: Optional[BaseException]) -> None:
     conn = g.pop('case_law_db', None)
     if conn is not None:
-        conn.close()
+        close_sqlite(conn)
 
 
 @app.before_request
@@ -911,6 +1230,9 @@ def _enforce_session_timeout():
         flash("Session expired due to inactivity. Please log in again.", "warning")
         return redirect(url_for("login"))
 
+    if last_activity and now - last_activity < SESSION_ACTIVITY_REFRESH:
+        return
+
     session.permanent = True
     session[SESSION_ACTIVITY_KEY] = now.isoformat()
 
@@ -918,14 +1240,12 @@ def _enforce_session_timeout():
 @app.before_request
 def _load_current_user() -> None:
     g.current_user = None
-    g.unread_count = 0
     user_id = session.get('user_id')
     if user_id is None:
         return
     user = get_user_by_id(user_id)
     if user and user['is_active']:
         g.current_user = user
-        g.unread_count = count_unread(user['id'])
     else:
         session.clear()
 
@@ -936,33 +1256,38 @@ def close_application_db(exc: Optional[BaseException]) -> None:
 
 
 def _bootstrap_app_state() -> None:
-    conn = get_app_db()
-    conn.close()
-    g.pop('app_db', None)
-
+    # Creates the database and applies migrations, then parks the connection
+    # in the pool for the first request.
+    get_app_db()
+    close_app_db(None)
 
-_bootstrap_app_state_ran = False
 
-if hasattr(app, 'before_first_request'):
-    app.before_first_request(_bootstrap_app_state)
-else:
-    @app.before_request
-    def _bootstrap_app_state_once():
-        global _bootstrap_app_state_ran
-        if _bootstrap_app_state_ran:
-            return
-        _bootstrap_app_state()
-        _bootstrap_app_state_ran = True
+# Run once at import instead of from a per-request hook.
+with app.app_context():
+    _bootstrap_app_state()
 
 
 @app.context_processor
 def inject_current_user() -> Dict[str, Any]:
+    # The navbar badge is only counted for rendered pages; JSON endpoints
+    # never need it. Views that already know the count set g.unread_count.
+    user = g.get('current_user')
+    unread_count = g.get('unread_count')
+    if unread_count is None:
+        unread_count = count_unread(user['id']) if user else 0
     return {
-        "current_user": g.get('current_user'),
-        "unread_count": g.get('unread_count', 0),
+        "current_user": user,
+        "unread_count": unread_count,
     }
 
 
+# FTS5 honours REPLACE on rowid, so one statement swaps out the old entry.
+_SQL_UPSERT_CASE_LAW_FTS = """
+    INSERT OR REPLACE INTO case_law_fts(rowid, content, petitioner, respondent, citation, note, case_id)
+    VALUES(?, ?, ?, ?, ?, ?, ?)
+"""
+
+
 def refresh_case_law_index(
     conn: sqlite3.Connection,
     case_id: int,
@@ -972,12 +1297,8 @@ def refresh_case_law_index(
     citation: str,
     note_text: str,
 ) -> None:
-    conn.execute("DELETE FROM case_law_fts WHERE rowid = ?", (case_id,))
     conn.execute(
-        """
-        INSERT INTO case_law_fts(rowid, content, petitioner, respondent, citation, note, case_id)
-        VALUES(?, ?, ?, ?, ?, ?, ?)
-        """,
+        _SQL_UPSERT_CASE_LAW_FTS,
         (
             case_id,
             judgement_text or "",
@@ -997,49 +1318,58 @@ _BOOLEAN_OPERATORS = {
     "not": "NOT",
     "near": "NEAR",
 }
+_BOOLEAN_OPERATOR_RE = re.compile(r"\b(and|or|not|near)\b", re.IGNORECASE)
+
+
+def _near_sub(match: re.Match) -> str:
+    left, distance, right = match.groups()
+    return f"NEAR({left} {right}, {distance})"
+
+
+def _operator_sub(match: re.Match) -> str:
+    return _BOOLEAN_OPERATORS[match.group(1).lower()]
 
 
 def normalize_boolean_query(raw: str) -> str:
+    # Most searches are a single plain word, which needs no rewriting.
+    if raw.isalnum() and raw.lower() not in _BOOLEAN_OPERATORS:
+        return raw
     query = normalize_ws(raw)
     if not query:
         return ""
 
-    def _near_sub(match: re.Match) -> str:
-        left, distance, right = match.groups()
-        return f"NEAR({left} {right}, {distance})"
+    if "/" in query:  # NEAR/<n> always carries a slash
+        query = _NEAR_RE.sub(_near_sub, query)
+    return _BOOLEAN_OPERATOR_RE.sub(_operator_sub, query)
+
+_SETUP_ALLOWED_ENDPOINTS = frozenset({
+    "setup",
+    "login",
+    "static",
+    "ping",
+    "__routes",
+    "forgot_password",
+    "reset_password",
+})
 
-    query = _NEAR_RE.sub(_near_sub, query)
-    for lower, upper in _BOOLEAN_OPERATORS.items():
-        query = re.sub(rf"\b{lower}\b", upper, query, flags=re.IGNORECASE)
-    return query
 
 @app.before_request
 def _require_setup():
-    allowed_endpoints = {
-        "setup",
-        "login",
-        "static",
-        "ping",
-        "__routes",
-        "forgot_password",
-        "reset_password",
-    }
-
     endpoint = request.endpoint or ""
 
     if not is_initial_setup_complete():
-        if endpoint not in allowed_endpoints:
+        if endpoint not in _SETUP_ALLOWED_ENDPOINTS:
             return redirect(url_for("setup"))
         return
 
-    if g.get('current_user') is None and endpoint not in allowed_endpoints:
+    if g.get('current_user') is None and endpoint not in _SETUP_ALLOWED_ENDPOINTS:
         flash("Please log in first.", "error")
         return redirect(url_for("login"))
 
 
 @app.route("/setup", methods=["GET", "POST"])
 def setup():
-    global FS_ROOT
+    global FS_ROOT, _setup_complete_cached
 
     if is_initial_setup_complete():
         return redirect(url_for("login"))
@@ -1151,11 +1481,12 @@ def setup():
                 config.save_fs_root(str(fs_root_path))
                 FS_ROOT = fs_root_path
 
-                settings_manager.set("smtp_host", form_state["smtp_host"])
-                settings_manager.set("smtp_port", smtp_port_int)
-                settings_manager.set("smtp_username", form_state["smtp_username"])
-                settings_manager.set("smtp_use_tls", bool(form_state["smtp_use_tls"]))
-                settings_manager.set("smtp_from_email", form_state["smtp_from_email"])
+                with settings_manager:
+                    settings_manager.set("smtp_host", form_state["smtp_host"])
+                    settings_manager.set("smtp_port", smtp_port_int)
+                    settings_manager.set("smtp_username", form_state["smtp_username"])
+                    settings_manager.set("smtp_use_tls", bool(form_state["smtp_use_tls"]))
+                    settings_manager.set("smtp_from_email", form_state["smtp_from_email"])
 
                 if smtp_password:
                     try:
@@ -1186,6 +1517,7 @@ def setup():
             for err in errors:
                 flash(err, "error")
         else:
+            _setup_complete_cached = True
             if admin_id is not None:
                 user_row = get_user_by_id(admin_id)
                 if user_row:
@@ -1203,79 +1535,17 @@ def setup():
             flash("Initial setup complete. You are signed in as the administrator.", "success")
             return redirect(url_for("home"))
 
-    template = """
-      <!doctype html>
-      <title>Case Organizer – Setup</title>
-      <link rel="stylesheet" href="{{ url_for('static', filename='css/style.css') }}">
-      <div class="login-body">
-        <div class="login-card">
-          <h2>Initial Setup</h2>
-          {% include '_flash.html' %}
-          <form method="post" class="login-form">
-            <label for="fs_root">Storage Folder</label>
-            <input id="fs_root" name="fs_root" type="text" value="{{ state.fs_root }}" placeholder="/mnt/data/case-files" required>
-
-            <h3>Outbound Email (SMTP)</h3>
-            {% if smtp_locked %}
-            <p class="setup-hint">
-              These SMTP settings were captured during installation. To change them later, run
-              <code>sudo dpkg-reconfigure case-organizer</code> after updating Postfix.
-            </p>
-            {% endif %}
-            <label for="smtp_host">SMTP Host</label>
-            <input id="smtp_host" name="smtp_host" type="text" value="{{ state.smtp_host }}" required{{ ' readonly' if smtp_locked else '' }}>
-
-            <label for="smtp_port">SMTP Port</label>
-            <input id="smtp_port" name="smtp_port" type="number" value="{{ state.smtp_port }}" required{{ ' readonly' if smtp_locked else '' }}>
-
-            <label for="smtp_username">SMTP Username</label>
-            <input id="smtp_username" name="smtp_username" type="text" value="{{ state.smtp_username }}"{{ ' readonly' if smtp_locked else '' }}>
-
-            <label for="smtp_password">SMTP Password</label>
-            <input id="smtp_password" name="smtp_password" type="password" autocomplete="new-password"{{ ' readonly' if smtp_locked else '' }}>
-
-            {% if smtp_locked %}
-            <label class="checkbox-inline locked-checkbox">
-              <input type="checkbox" value="1" {% if state.smtp_use_tls %}checked{% endif %} disabled>
-              Use TLS/STARTTLS
-            </label>
-            <input type="hidden" name="smtp_use_tls" value="{{ '1' if state.smtp_use_tls else '' }}">
-            {% else %}
-            <label class="checkbox-inline">
-              <input type="checkbox" name="smtp_use_tls" value="1" {% if state.smtp_use_tls %}checked{% endif %}>
-              Use TLS/STARTTLS
-            </label>
-            {% endif %}
-
-            <label for="smtp_from_email">From Email</label>
-            <input id="smtp_from_email" name="smtp_from_email" type="email" value="{{ state.smtp_from_email }}" required{{ ' readonly' if smtp_locked else '' }}>
-
-            <h3>Administrator Account</h3>
-            <label for="admin_email">Admin Email</label>
-            <input id="admin_email" name="admin_email" type="email" value="{{ state.admin_email }}" required>
-
-            <label for="admin_password">Password</label>
-            <input id="admin_password" name="admin_password" type="password" autocomplete="new-password" required>
-
-            <label for="admin_password2">Confirm Password</label>
-            <input id="admin_password2" name="admin_password2" type="password" autocomplete="new-password" required>
-
-            <button class="btn-primary" type="submit">Complete Setup</button>
-          </form>
-          <p class="login-foot">Settings stored in {{ settings_path }}</p>
-        </div>
-      </div>
-    """
-
-    return render_template_string(
-        template,
+    return render_template(
+        "setup.html",
         state=form_state,
+        smtp_locked=smtp_locked,
         settings_path=str(settings_manager.paths.settings_file),
     )
 
 
 def allowed_file(filename: str) -> bool:
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+    _, dot, ext = filename.rpartition(".")
+    return bool(dot) and ext.lower() in ALLOWED_EXTENSIONS
 
 def month_dir_name(dt: datetime) -> str:
     # e.g., "Jan", "Feb" ...
@@ -1289,12 +1559,17 @@ def normalize_ws(s: str) -> str:
 
 
 _ILLEGAL_FS_CHARS = re.compile(r"[\\/:*?\"<>|]")
+_ILLEGAL_OR_WS = re.compile(r"[\\/:*?\"<>|\s]+")
+_WORD_RE = re.compile(r"\S+")
 
 
 def sanitize_case_law_component(text: str, replacement: str = " ") -> str:
-    cleaned = normalize_ws(text)
-    cleaned = _ILLEGAL_FS_CHARS.sub(replacement, cleaned)
-    cleaned = normalize_ws(cleaned)
+    if replacement == " ":
+        # Illegal characters become whitespace and collapse with it: one pass.
+        return _ILLEGAL_OR_WS.sub(" ", text or "").strip()
+    cleaned = _ILLEGAL_FS_CHARS.sub(replacement, normalize_ws(text))
+    if replacement.strip() != replacement:
+        cleaned = normalize_ws(cleaned)
     return cleaned
 
 
@@ -1303,36 +1578,69 @@ def build_case_law_display_name(petitioner: str, respondent: str, citation: str)
 
 
 def ensure_unique_path(path: Path) -> Path:
+    """Return ``path``, or ``"stem (N)suffix"`` past the highest N already used.
+
+    The parent is listed once rather than probing N = 1, 2, ... with a stat
+    each, which went quadratic when many copies of a name existed.
+    """
     if not path.exists():
         return path
     stem = path.stem
     suffix = path.suffix
     parent = path.parent
-    counter = 1
+    pattern = re.compile(re.escape(stem) + r" \((\d+)\)" + re.escape(suffix))
+    highest = 0
+    with os.scandir(parent) as entries:
+        for entry in entries:
+            match = pattern.fullmatch(entry.name)
+            if match:
+                highest = max(highest, int(match.group(1)))
+    return parent / f"{stem} ({highest + 1}){suffix}"
+
+
+def _reserve_unique_path(directory: Path, stem: str, suffix: str) -> Path:
+    """Create an empty ``stem[_N]suffix`` in ``directory`` and return its path.
+
+    O_EXCL makes the existence check and the claim a single atomic step, so
+    concurrent uploads of the same name cannot pick the same target; the
+    caller then os.replace()s its temp file over the placeholder.
+    """
+    counter = 0
     while True:
-        candidate = parent / f"{stem} ({counter}){suffix}"
-        if not candidate.exists():
-            return candidate
-        counter += 1
+        name = f"{stem}_{counter}{suffix}" if counter else f"{stem}{suffix}"
+        candidate = directory / name
+        try:
+            fd = os.open(candidate, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+        except FileExistsError:
+            counter += 1
+            continue
+        os.close(fd)
+        return candidate
+
+
+def _move_to_unique_path(tmp: Path, directory: Path, stem: str, suffix: str) -> Path:
+    """Move ``tmp`` into ``directory`` under a reserved ``stem[_N]suffix`` name.
+
+    If the move fails, the placeholder and ``tmp`` are both removed so no
+    empty file is left behind to show up as a document.
+    """
+    final_dest = _reserve_unique_path(directory, stem, suffix)
+    try:
+        os.replace(tmp, final_dest)
+    except BaseException:
+        for path in (final_dest, tmp):
+            with suppress(FileNotFoundError):
+                path.unlink()
+        raise
+    return final_dest
 
 
 def normalize_primary_type(value: str) -> Optional[str]:
-    candidate = normalize_ws(value)
-    for option in CASE_LAW_PRIMARY_TYPES:
-        if candidate.lower() == option.lower():
-            return option
-    return None
+    return _CASE_LAW_PRIMARY_LOOKUP.get(normalize_ws(value).lower())
 
 
 def normalize_case_type(primary: str, value: str) -> Optional[str]:
-    pool = CASE_LAW_CASE_TYPES.get(primary)
-    if not pool:
-        return None
-    candidate = normalize_ws(value)
-    for option in pool:
-        if candidate.lower() == option.lower():
-            return option
-    return None
+    return _CASE_LAW_TYPE_LOOKUP.get(primary, {}).get(normalize_ws(value).lower())
 
 
 def case_law_error(message: str, status: int = 400):
@@ -1342,7 +1650,16 @@ def case_law_error(message: str, status: int = 400):
 def short_excerpt(text: str, limit: int = 200) -> str:
     if not text:
         return ""
-    compact = normalize_ws(text)
+    # Collapse whitespace word by word and stop once past ``limit`` so long
+    # extracted documents are not normalised in full just to be truncated.
+    words = []
+    length = -1
+    for match in _WORD_RE.finditer(text):
+        words.append(match.group())
+        length += len(words[-1]) + 1
+        if length > limit:
+            break
+    compact = " ".join(words)
     if len(compact) <= limit:
         return compact
     return compact[: max(0, limit - 1)].rstrip() + "…"
@@ -1351,7 +1668,7 @@ def short_excerpt(text: str, limit: int = 200) -> str:
 def extract_note_summary(content: str) -> str:
     raw = content or ""
     try:
-        parsed = json.loads(raw)
+        parsed = _json_loads(raw)
         if isinstance(parsed, dict):
             for key in ("Note", "note", "Summary", "summary", "Additional Notes", "additional_notes"):
                 value = parsed.get(key)
@@ -1366,27 +1683,43 @@ def fetch_case_law_record(conn: sqlite3.Connection, case_id: int) -> Optional[sq
     return conn.execute("SELECT * FROM case_law WHERE id = ?", (case_id,)).fetchone()
 
 
+_fs_root_resolved: tuple[Optional[Path], Optional[Path]] = (None, None)
+
+
+def _resolved_fs_root() -> Path:
+    """``FS_ROOT.resolve()``, recomputed only when FS_ROOT is reassigned."""
+    global _fs_root_resolved
+    source, resolved = _fs_root_resolved
+    if source is not FS_ROOT or resolved is None:
+        resolved = FS_ROOT.resolve()
+        _fs_root_resolved = (FS_ROOT, resolved)
+    return resolved
+
+
+def _within_fs_root(path: Path) -> bool:
+    # is_relative_to compares whole components, so /data/root2 is not
+    # mistaken for a child of /data/root the way a string prefix test was.
+    return path.is_relative_to(_resolved_fs_root())
+
+
 def case_law_file_path(row: sqlite3.Row) -> Path:
     base = (FS_ROOT / row["folder_rel"]).resolve()
     full = (base / row["file_name"]).resolve()
-    root = FS_ROOT.resolve()
-    if not str(full).startswith(str(root)):
+    if not _within_fs_root(full):
         raise RuntimeError("Resolved file path escapes storage root")
     return full
 
 
 def case_law_folder_path(row: sqlite3.Row) -> Path:
     folder = (FS_ROOT / row["folder_rel"]).resolve()
-    root = FS_ROOT.resolve()
-    if not str(folder).startswith(str(root)):
+    if not _within_fs_root(folder):
         raise RuntimeError("Resolved folder path escapes storage root")
     return folder
 
 
 def case_law_note_path(row: sqlite3.Row) -> Path:
     note = (FS_ROOT / row["note_path_rel"]).resolve()
-    root = FS_ROOT.resolve()
-    if not str(note).startswith(str(root)):
+    if not _within_fs_root(note):
         raise RuntimeError("Resolved note path escapes storage root")
     return note
 
@@ -1415,23 +1748,30 @@ def serialize_case_law(row: sqlite3.Row, text_preview: str = "") -> Dict[str, An
 def case_dir(year: int, month_str: str, case_name: str) -> Path:
     return FS_ROOT / f"{year}" / month_str / case_name
 
+_DOMAIN_CODE_MAP = {
+    "criminal":   "CRL",
+    "civil":      "CIVIL",
+    "commercial": "COMM",
+}
+
+# Extend this mapping as needed
+_TYPE_CODE_MAP = {
+    "transfer petition":      "TP",
+    "criminal revision":      "CRL.REV.",
+    "writ petition":          "WP",
+    "bail application":       "BAIL",
+    "orders":                 "ORD",
+    "order":                  "ORD",
+    "criminal miscellaneous": "CRL.MISC.",
+}
+
 def domain_code(domain: str) -> str:
     d = (domain or "").strip().lower()
-    if d == "criminal": return "CRL"
-    if d == "civil":    return "CIVIL"
-    if d == "commercial": return "COMM"
-    return d.upper() if d else ""
+    return _DOMAIN_CODE_MAP.get(d, d.upper())
 
 def type_code(main_type: str) -> str:
     m = (main_type or "").strip().lower()
-    # Extend this mapping as needed
-    if m == "transfer petition":      return "TP"
-    if m == "criminal revision":      return "CRL.REV."
-    if m == "writ petition":          return "WP"
-    if m == "bail application":       return "BAIL"
-    if m == "orders" or m == "order": return "ORD"
-    if m == "criminal miscellaneous": return "CRL.MISC."
-    return (main_type or "").upper()
+    return _TYPE_CODE_MAP.get(m) or (main_type or "").upper()
 
 def build_filename(dt: datetime, main_type: str, domain: str, case_name: str, ext: str) -> str:
     # (DDMMYYYY) TYPE DOMAIN Petitioner v. Respondent.ext
@@ -1444,15 +1784,40 @@ def build_case_name_from_parties(petitioner: str, respondent: str) -> str:
     return f"{pn} v. {rn}" if pn and rn else ""
 
 
+# PDFium is not thread-safe, even across separate documents, so every call
+# into it must stay on the single case-law index worker below.
+try:
+    import pypdfium2 as pdfium  # PDFium bindings; far faster than pdfminer
+except ImportError:  # pragma: no cover - optional speedup
+    pdfium = None
+
+
+def _extract_pdf_text(file_path: Path) -> str:
+    if pdfium is None:
+        from pdfminer.high_level import extract_text  # type: ignore
+
+        return extract_text(str(file_path))
+
+    doc = pdfium.PdfDocument(str(file_path))
+    try:
+        parts: list[str] = []
+        for page in doc:
+            textpage = page.get_textpage()
+            parts.append(textpage.get_text_range())
+            textpage.close()
+            page.close()
+        return "\n".join(parts)
+    finally:
+        doc.close()
+
+
 def extract_text_for_index(file_path: Path) -> str:
     suffix = file_path.suffix.lower()
     try:
-        if suffix == ".pdf":
-            from pdfminer.high_level import extract_text  # type: ignore
-
-            return extract_text(str(file_path))
         if suffix == ".txt":
             return file_path.read_text(encoding="utf-8", errors="ignore")
+        if suffix == ".pdf":
+            return _extract_pdf_text(file_path)
         if suffix == ".docx":
             from docx import Document  # type: ignore
 
@@ -1463,50 +1828,146 @@ def extract_text_for_index(file_path: Path) -> str:
     return ""
 
 
+# Judgment text extraction can take seconds for long PDFs, so uploads hand it
+# to a background pool (like invoice rendering and email) and return at once.
+# One worker only: PDFium must never be entered from two threads at a time.
+_INDEX_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="caseorg-case-law-index")
+
+
+def _save_upload_sha256(upload, dest: Path) -> str:
+    """Save ``upload`` to ``dest`` and return the SHA-256 of its bytes."""
+    digest = hashlib.sha256()
+    with open(dest, "wb") as fh:
+        while chunk := upload.stream.read(UPLOAD_BUFFER_SIZE):
+            digest.update(chunk)
+            fh.write(chunk)
+    return digest.hexdigest()
+
+
+def _index_case_law_text(db_path: Path, case_id: int, file_path: Path, digest: Optional[str]) -> None:
+    conn = connect_sqlite(db_path)
+    try:
+        judgement_text = None
+        if file_path.suffix.lower() not in {".pdf", ".docx"}:
+            # Plain text is read directly; caching it would only duplicate it.
+            digest = None
+        if digest:
+            row = conn.execute("SELECT text FROM text_cache WHERE sha = ?", (digest,)).fetchone()
+            if row:
+                judgement_text = row[0]
+        if judgement_text is None:
+            judgement_text = extract_text_for_index(file_path)
+        if not judgement_text:
+            return
+        with conn:
+            if digest:
+                # Skipped if the case was deleted meanwhile, so no row is
+                # left that nothing would prune.
+                conn.execute(
+                    "INSERT OR IGNORE INTO text_cache(sha, text) "
+                    "SELECT ?, ? WHERE EXISTS (SELECT 1 FROM case_law WHERE id = ?)",
+                    (digest, judgement_text, case_id),
+                )
+            # Only the content column is touched so a note edited meanwhile
+            # is kept; a case deleted meanwhile simply matches no row.
+            conn.execute(
+                "UPDATE case_law_fts SET content = ? WHERE rowid = ?",
+                (judgement_text, case_id),
+            )
+    finally:
+        close_sqlite(conn)
+
+
+def _log_indexing_result(future: Future) -> None:
+    try:
+        future.result()
+    except Exception as exc:
+        logging.getLogger("caseorg.case_law").error("Background indexing failed: %s", exc, exc_info=True)
+
+
+def enqueue_case_law_indexing(case_id: int, file_path: Path, digest: Optional[str] = None) -> Future:
+    """Extract ``file_path`` in the background and add its text to the index.
+
+    ``digest`` is the file's SHA-256; text already cached under it is reused.
+    """
+    future = _INDEX_EXECUTOR.submit(_index_case_law_text, _case_law_db_file(), case_id, file_path, digest)
+    future.add_done_callback(_log_indexing_result)
+    return future
+
+
 def make_note_json(payload: Dict[str, Any]) -> str:
     """
     Produce a human-readable JSON-like text with blank lines between sections.
     Valid JSON with extra blank lines (allowed) for easy reading in editors.
     """
-    from collections import OrderedDict
-    from json import dumps
-
-    od = OrderedDict()
-    # Parties
-    od["Petitioner Name"] = payload.get("Petitioner Name", "")
-    od["Petitioner Address"] = payload.get("Petitioner Address", "")
-    od["Petitioner Contact"] = payload.get("Petitioner Contact", "")
-    od["__BLANK1__"] = ""
-    od["Respondent Name"] = payload.get("Respondent Name", "")
-    od["Respondent Address"] = payload.get("Respondent Address", "")
-    od["Respondent Contact"] = payload.get("Respondent Contact", "")
-    od["__BLANK2__"] = ""
-    od["Our Party"] = payload.get("Our Party", "")
-    od["__BLANK3__"] = ""
-    # Classification
-    od["Case Category"] = payload.get("Case Category", "")
-    od["Case Subcategory"] = payload.get("Case Subcategory", "")
-    od["Case Type"] = payload.get("Case Type", "")
-    od["__BLANK4__"] = ""
-    # Courts
-    od["Court of Origin"] = {
-        "State":   payload.get("Origin State", ""),
-        "District":payload.get("Origin District", ""),
-        "Court/Forum": payload.get("Origin Court/Forum", ""),
-    }
-    od["__BLANK5__"] = ""
-    od["Current Court/Forum"] = {
-        "State":   payload.get("Current State", ""),
-        "District":payload.get("Current District", ""),
-        "Court/Forum": payload.get("Current Court/Forum", ""),
-    }
-    od["__BLANK6__"] = ""
-    od["Additional Notes"] = payload.get("Additional Notes", "")
+    sections = [
+        # Parties
+        [
+            ("Petitioner Name", payload.get("Petitioner Name", "")),
+            ("Petitioner Address", payload.get("Petitioner Address", "")),
+            ("Petitioner Contact", payload.get("Petitioner Contact", "")),
+        ],
+        [
+            ("Respondent Name", payload.get("Respondent Name", "")),
+            ("Respondent Address", payload.get("Respondent Address", "")),
+            ("Respondent Contact", payload.get("Respondent Contact", "")),
+        ],
+        [("Our Party", payload.get("Our Party", ""))],
+        # Classification
+        [
+            ("Case Category", payload.get("Case Category", "")),
+            ("Case Subcategory", payload.get("Case Subcategory", "")),
+            ("Case Type", payload.get("Case Type", "")),
+        ],
+        # Courts
+        [("Court of Origin", {
+            "State":   payload.get("Origin State", ""),
+            "District":payload.get("Origin District", ""),
+            "Court/Forum": payload.get("Origin Court/Forum", ""),
+        })],
+        [("Current Court/Forum", {
+            "State":   payload.get("Current State", ""),
+            "District":payload.get("Current District", ""),
+            "Court/Forum": payload.get("Current Court/Forum", ""),
+        })],
+        [("Additional Notes", payload.get("Additional Notes", ""))],
+    ]
 
-    s = dumps(od, indent=2, ensure_ascii=False)
-    # Replace spacer keys with blank lines
-    s = re.sub(r'\n\s+"__BLANK[0-9]+__":\s*"",\n', "\n\n", s)
-    return s
+    def _member(key: str, value: Any) -> str:
+        # Nested objects are re-indented to sit one level inside the root.
+        value_text = json.dumps(value, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+        return f"  {json.dumps(key, ensure_ascii=False)}: {value_text}"
+
+    body = ",\n\n".join(
+        ",\n".join(_member(key, value) for key, value in section) for section in sections
+    )
+    return "{\n" + body + "\n}"
+
+
+_EMPTY_NOTE_TEMPLATE = make_note_json({})
+
+# Note.json text by path, reused while the file's mtime and size are unchanged
+# so the notes modal can poll without re-reading and decoding the file.
+_NOTE_CACHE_MAX = 256
+_note_cache: "OrderedDict[str, tuple[int, int, str]]" = OrderedDict()
+_note_cache_lock = Lock()
+
+
+def read_note_text(note_path: Path) -> str:
+    key = str(note_path)
+    st = os.stat(key)
+    with _note_cache_lock:
+        entry = _note_cache.get(key)
+        if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            _note_cache.move_to_end(key)
+            return entry[2]
+    content = note_path.read_text(encoding="utf-8")
+    with _note_cache_lock:
+        _note_cache[key] = (st.st_mtime_ns, st.st_size, content)
+        _note_cache.move_to_end(key)
+        if len(_note_cache) > _NOTE_CACHE_MAX:
+            _note_cache.popitem(last=False)
+    return content
 
 # ---- Diagnostics --------------------------------------------------------
 @app.get("/ping")
@@ -1522,25 +1983,33 @@ def __routes():
     return "<pre>" + "\n".join(sorted(lines)) + "</pre>"
 
 # ---- Browse APIs for Manage Case ---------------------------------------
+def _subdir_names(path: Path) -> list[str]:
+    """Names of the directories directly under ``path`` (empty if missing).
+
+    ``os.scandir`` reports the entry type from the directory listing, so only
+    symlinks need an extra ``stat``.
+    """
+    try:
+        with os.scandir(path) as entries:
+            return [entry.name for entry in entries if entry.is_dir()]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+def _is_year_name(name: str) -> bool:
+    return len(name) == 4 and name.isdecimal()
+
+
 @app.get("/api/years")
 def api_years():
-    years = []
-    if FS_ROOT.exists():
-        for p in FS_ROOT.iterdir():
-            if p.is_dir() and re.fullmatch(r"\d{4}", p.name):
-                years.append(p.name)
+    years = [name for name in _subdir_names(FS_ROOT) if _is_year_name(name)]
     years.sort()  # ascending "2024", "2025"
     return jsonify({"years": years})
 
 @app.get("/api/months")
 def api_months():
     year = (request.args.get("year") or "").strip()
-    months = []
-    base = FS_ROOT / year
-    if year and base.exists() and base.is_dir():
-        for m in base.iterdir():
-            if m.is_dir():
-                months.append(m.name)
+    months = _subdir_names(FS_ROOT / year) if year else []
     # order by calendar month if using Jan..Dec names
     order = ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"]
     months.sort(key=lambda x: order.index(x) if x in order else x)
@@ -1550,16 +2019,54 @@ def api_months():
 def api_cases():
     year  = (request.args.get("year") or "").strip()
     month = (request.args.get("month") or "").strip()
-    cases = []
-    base = FS_ROOT / year / month
-    if base.exists() and base.is_dir():
-        for d in base.iterdir():
-            if d.is_dir():
-                cases.append(d.name)
+    cases = _subdir_names(FS_ROOT / year / month)
     cases.sort(key=lambda s: s.lower())  # alphabetical by case name
     return jsonify({"cases": cases})
 
 
+def _sync_case_name_index(conn: sqlite3.Connection) -> None:
+    """Bring ``case_names_fts`` in line with the case folders on disk.
+
+    Adding or removing a case folder bumps its month folder's mtime, so a sync
+    costs one stat per month folder and re-lists only the months that changed.
+    """
+    known = {
+        (row["year"], row["month"]): row["mtime_ns"]
+        for row in conn.execute("SELECT year, month, mtime_ns FROM case_name_months")
+    }
+    seen: set[tuple[str, str]] = set()
+    changed: list[tuple[str, str, int, list[str]]] = []
+    for year in _subdir_names(FS_ROOT):
+        if not _is_year_name(year):
+            continue
+        year_dir = FS_ROOT / year
+        try:
+            with os.scandir(year_dir) as entries:
+                months = [(entry.name, entry.stat().st_mtime_ns) for entry in entries if entry.is_dir()]
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        for month, mtime_ns in months:
+            seen.add((year, month))
+            if known.get((year, month)) != mtime_ns:
+                changed.append((year, month, mtime_ns, _subdir_names(year_dir / month)))
+
+    stale = [key for key in known if key not in seen] + [(year, month) for year, month, _, _ in changed]
+    if not stale:
+        return
+    with conn:
+        conn.executemany("DELETE FROM case_names_fts WHERE year = ? AND month = ?", stale)
+        conn.executemany("DELETE FROM case_name_months WHERE year = ? AND month = ?", stale)
+        for year, month, mtime_ns, names in changed:
+            conn.executemany(
+                "INSERT INTO case_names_fts(year, month, name, name_lower) VALUES(?, ?, ?, ?)",
+                [(year, month, name, name.lower()) for name in names],
+            )
+            conn.execute(
+                "INSERT INTO case_name_months(year, month, mtime_ns) VALUES(?, ?, ?)",
+                (year, month, mtime_ns),
+            )
+
+
 @app.get("/api/cases/search")
 def api_case_search():
     query = (request.args.get("q") or "").strip()
@@ -1567,30 +2074,24 @@ def api_case_search():
     if not query:
         return jsonify({"cases": matches})
 
+    conn = get_case_law_db()
+    _sync_case_name_index(conn)
+
     lowered = query.lower()
-    if FS_ROOT.exists():
-        for year_dir in FS_ROOT.iterdir():
-            if not year_dir.is_dir():
-                continue
-            year = year_dir.name
-            if not re.fullmatch(r"\d{4}", year):
-                continue
-            for month_dir in year_dir.iterdir():
-                if not month_dir.is_dir():
-                    continue
-                month = month_dir.name
-                for case_dir in month_dir.iterdir():
-                    if not case_dir.is_dir():
-                        continue
-                    case_name = case_dir.name
-                    if lowered in case_name.lower():
-                        matches.append({
-                            "year": year,
-                            "month": month,
-                            "case": case_name,
-                        })
-                        if len(matches) >= 100:
-                            return jsonify({"cases": matches})
+    if any(ch in lowered for ch in "%_\\"):
+        # ESCAPE makes SQLite skip the trigram index, so only use it when needed.
+        escaped = re.sub(r"([%_\\])", r"\\\1", lowered)
+        sql = "SELECT year, month, name FROM case_names_fts WHERE name_lower LIKE ? ESCAPE '\\' LIMIT 100"
+        pattern = f"%{escaped}%"
+    else:
+        sql = "SELECT year, month, name FROM case_names_fts WHERE name_lower LIKE ? LIMIT 100"
+        pattern = f"%{lowered}%"
+    for row in conn.execute(sql, (pattern,)):
+        matches.append({
+            "year": row["year"],
+            "month": row["month"],
+            "case": row["name"],
+        })
     return jsonify({"cases": matches})
 
 
@@ -1625,19 +2126,7 @@ def login():
             return redirect(url_for("home"))
         flash("Invalid email or password.", "error")
 
-    try:
-        return render_template("login.html", email=email_value, username=email_value)
-    except Exception:
-        return render_template_string("""
-            <!doctype html><title>Login</title>
-            <h1>Case Organizer</h1>
-            <form method="post">
-              <input name="email" type="email" placeholder="Email" value="{{ email }}" required>
-              <input name="password" type="password" placeholder="Password" required>
-              <button>Sign In</button>
-            </form>
-            <p><a href="{{ url_for('forgot_password') }}">Forgot your password?</a></p>
-        """, email=email_value)
+    return render_template("login.html", email=email_value, username=email_value)
 
 
 @app.route("/logout")
@@ -1665,7 +2154,7 @@ def forgot_password():
                 "If you did not request this change, you can ignore this email."
             )
             try:
-                future = send_email_async(user["email"], "Case Organizer password reset", body)
+                send_email_async(user["email"], "Case Organizer password reset", body)
             except EmailConfigError:
                 flash("Email is not configured. Contact an administrator to reset your password.", "error")
                 return redirect(url_for("forgot_password"))
@@ -1673,30 +2162,12 @@ def forgot_password():
                 flash("Unable to send the reset email. Try again later or contact an administrator.", "error")
                 return redirect(url_for("forgot_password"))
             else:
-                try:
-                    future.result(timeout=1.0)
-                except FutureTimeout:
-                    app.logger.info("Password reset email queued for %s", user["email"])
-                except Exception as exc:
-                    app.logger.error("Password reset email failed quickly: %s", exc, exc_info=True)
-                    flash("Unable to send the reset email. Try again later or contact an administrator.", "error")
-                    return redirect(url_for("forgot_password"))
+                app.logger.info("Password reset email queued for %s", user["email"])
 
         flash("If that email is registered, reset instructions have been sent.", "info")
         return redirect(url_for("login"))
 
-    try:
-        return render_template("forgot_password.html")
-    except Exception:
-        return render_template_string("""
-            <!doctype html><title>Forgot Password</title>
-            <h1>Reset your password</h1>
-            <form method="post">
-              <input name="email" type="email" placeholder="Email" required>
-              <button>Send reset link</button>
-            </form>
-            <p><a href="{{ url_for('login') }}">Back to login</a></p>
-        """)
+    return render_template("forgot_password.html")
 
 
 @app.route("/reset-password/<token>", methods=["GET", "POST"])
@@ -1730,36 +2201,12 @@ def reset_password(token: str):
             flash("Password updated. You are now signed in.", "success")
             return redirect(url_for("home"))
 
-    try:
-        return render_template("reset_password.html")
-    except Exception:
-        return render_template_string("""
-            <!doctype html><title>Reset Password</title>
-            <h1>Choose a new password</h1>
-            <form method="post">
-              <input name="password" type="password" placeholder="New password" required>
-              <input name="password2" type="password" placeholder="Confirm password" required>
-              <button>Update password</button>
-            </form>
-            <p><a href="{{ url_for('login') }}">Back to login</a></p>
-        """)
+    return render_template("reset_password.html")
 
 
 @app.route("/")
 def home():
-    try:
-        return render_template("index.html")
-    except Exception:
-        return render_template_string("""
-            <!doctype html><title>Home</title>
-            <h1>Home (fallback)</h1>
-            {% if current_user %}
-              <p>Logged in as: {{ current_user.email }}</p>
-            {% else %}
-              <p>You are not signed in.</p>
-            {% endif %}
-            <p><a href="{{ url_for('logout') }}">Logout</a></p>
-        """)
+    return render_template("index.html")
 
 
 @app.route("/account", methods=["GET", "POST"])
@@ -1775,7 +2222,7 @@ def account():
             current_password = request.form.get("current_password") or ""
             if not new_email:
                 flash("Email cannot be empty.", "error")
-            elif authenticate_user(user['email'], current_password) is None:
+            elif not authenticate_user_by_id(user['id'], current_password):
                 flash("Current password is incorrect.", "error")
             else:
                 try:
@@ -1794,7 +2241,7 @@ def account():
             current_password = request.form.get("current_password") or ""
             new_password = request.form.get("new_password") or ""
             confirm_password = request.form.get("confirm_password") or ""
-            if authenticate_user(user['email'], current_password) is None:
+            if not authenticate_user_by_id(user['id'], current_password):
                 flash("Current password is incorrect.", "error")
             elif len(new_password) < 8:
                 flash("New password must be at least 8 characters long.", "error")
@@ -1807,19 +2254,14 @@ def account():
         else:
             flash("Unknown action submitted.", "error")
 
-    try:
-        return render_template("account.html")
-    except Exception:
-        return render_template_string("""
-            <!doctype html><title>My Account</title>
-            <h1>My Account</h1>
-            <p>Email: {{ current_user.email }}</p>
-        """)
+    return render_template("account.html")
 
 
 @app.route("/invoice", methods=["GET"])
 @require_login
 def invoice_form():
+    if not request.args:
+        return render_template("invoice.html", case_context=None)
     case_year = (request.args.get("year") or "").strip()
     case_month = (request.args.get("month") or "").strip()
     case_name = (request.args.get("case") or "").strip()
@@ -1831,14 +2273,7 @@ def invoice_form():
             "case": case_name,
             "label": f"{case_year} / {case_month} — {case_name}",
         }
-    try:
-        return render_template("invoice.html", case_context=case_context)
-    except Exception:
-        return render_template_string("""
-            <!doctype html><title>Generate Invoice</title>
-            <h1>Invoice Generator</h1>
-            <p>Unable to load the styled template. Please contact support.</p>
-        """)
+    return render_template("invoice.html", case_context=case_context)
 
 
 @app.post("/invoice/save")
@@ -1847,63 +2282,34 @@ def invoice_save():
     payload = request.get_json(silent=True)
     if not isinstance(payload, dict):
         return jsonify({"ok": False, "msg": "Invalid invoice payload."}), 400
-    case_year = (payload.get("case_year") or "").strip()
-    case_month = (payload.get("case_month") or "").strip()
-    case_name = (payload.get("case_name") or "").strip()
-    requested_number = str(payload.get("invoice_number") or "").strip()
-
-    invoice_data: Dict[str, Any] = {
-        "invoice_number": requested_number,
-        "invoice_date": str(payload.get("invoice_date") or "").strip()[:120],
-        "client_name": str(payload.get("client_name") or "").strip()[:180],
-        "issuer_lines": _clean_lines(payload.get("issuer_lines") or []),
-        "recipient_lines": _clean_lines(payload.get("recipient_lines") or []),
-        "generated_at": payload.get("generated_at") or datetime.utcnow().isoformat(),
-    }
-
-    two_places = Decimal("0.01")
-
-    def _as_decimal(value: Any, default: Decimal = Decimal("0")) -> Decimal:
-        if value in (None, "", False):
-            return default
-        try:
-            return Decimal(str(value))
-        except (InvalidOperation, ValueError, TypeError):
-            return default
-
-    items: list[dict[str, Any]] = []
-    computed_total = Decimal("0")
-    for row in payload.get("items") or []:
-        if not isinstance(row, dict):
-            continue
-        amount_decimal = _as_decimal(row.get("amount"))
-        computed_total += amount_decimal
-        cleaned = {
-            "sn": str(row.get("sn") or "").strip()[:40],
-            "item": str(row.get("item") or "").strip()[:160],
-            "description": str(row.get("description") or "").strip()[:600],
-            "amount": str(amount_decimal.quantize(two_places)),
-        }
-        if any(cleaned.values()):
-            items.append(cleaned)
-    invoice_data["items"] = items
-
-    requested_total = _as_decimal(payload.get("total"), computed_total if items else Decimal("0"))
-    if items and requested_total == Decimal("0") and computed_total > Decimal("0"):
-        requested_total = computed_total
-    invoice_data["total"] = str(requested_total.quantize(two_places))
+    case_year, case_month, case_name = _invoice_case_fields(payload)
+    invoice_data = _invoice_data_from_payload(payload)
+    requested_number = invoice_data["invoice_number"]
+    # Callers that only need the number and the stored record can skip the
+    # PDF render, which dominates the cost of a save.
+    want_pdf = not (
+        request.args.get("pdf") == "0"
+        or request.accept_mimetypes.best == "application/json"
+    )
 
     conn = get_app_db()
     user_id = g.current_user["id"] if g.get("current_user") else None
-    pdf_bytes: Optional[bytes] = None
     final_number: Optional[str] = None
     primary_path: Optional[Path] = None
     case_copy_path: Optional[Path] = None
     relative_path = ""
-    auto_assigned = False
+    reserved = False
+    counter_before = counter_after = 0
 
     try:
+        # Check or reserve the number and insert the row (its file path is
+        # filled in once the PDF exists) in one short write transaction, so
+        # the render runs with the database unlocked while the number stays
+        # claimed.
         with conn:
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            counter_before = _get_invoice_counter(conn)
             if requested_number:
                 final_number = requested_number
                 existing = conn.execute(
@@ -1912,90 +2318,60 @@ def invoice_save():
                 ).fetchone()
                 if existing:
                     raise InvoiceNumberConflict
+                _ensure_counter_after_use(conn, _parse_invoice_number(final_number))
             else:
                 final_number = _reserve_invoice_number(conn)
-                auto_assigned = True
 
             invoice_data["invoice_number"] = final_number
-
-            try:
-                pdf_buffer, _ = generate_invoice_pdf(invoice_data)
-            except RuntimeError as exc:
-                raise RuntimeError(str(exc)) from exc
-            except Exception as exc:
-                raise InvoiceStorageError(f"Failed to render invoice: {exc}") from exc
-
-            pdf_bytes = pdf_buffer.getvalue()
-            primary_path, case_copy_path = _invoice_target_path(
-                final_number, case_year, case_month, case_name
+            _insert_invoice_row(
+                conn,
+                final_number,
+                case_year,
+                case_month,
+                case_name,
+                "",
+                _invoice_record_json(invoice_data, case_year, case_month, case_name),
+                user_id,
             )
-            try:
-                primary_path.write_bytes(pdf_bytes)
-                if case_copy_path:
-                    case_copy_path.write_bytes(pdf_bytes)
-            except OSError as exc:
-                with suppress(FileNotFoundError):
-                    primary_path.unlink()
-                if case_copy_path:
-                    with suppress(FileNotFoundError):
-                        case_copy_path.unlink()
-                raise InvoiceStorageError(f"Unable to write invoice PDF: {exc}") from exc
+            counter_after = _get_invoice_counter(conn)
+        reserved = True
 
-            try:
-                relative_path = (
-                    str(primary_path.relative_to(FS_ROOT))
-                    if FS_ROOT
-                    else str(primary_path)
-                )
-            except Exception:
-                relative_path = str(primary_path)
-
-            payload_for_record = dict(invoice_data)
-            payload_for_record.update(
-                {
-                    "case_year": case_year,
-                    "case_month": case_month,
-                    "case_name": case_name,
-                }
+        if want_pdf:
+            primary_path, case_copy_path = _store_rendered_invoice(
+                generate_invoice_pdf_async(invoice_data),
+                invoice_data,
+                case_year,
+                case_month,
+                case_name,
             )
-            payload_json = json.dumps(payload_for_record, ensure_ascii=False)
-
-            try:
-                _insert_invoice_row(
-                    conn,
-                    final_number,
-                    case_year,
-                    case_month,
-                    case_name,
-                    relative_path,
-                    payload_json,
-                    user_id,
+            relative_path = _invoice_relative_path(primary_path)
+            with conn:
+                conn.execute(
+                    "UPDATE invoices SET file_path = ? WHERE invoice_number = ?",
+                    (relative_path, final_number),
                 )
-            except InvoiceNumberConflict:
+    except Exception as exc:
+        for path in (primary_path, case_copy_path):
+            if path:
                 with suppress(FileNotFoundError):
-                    primary_path.unlink()
-                if case_copy_path:
-                    with suppress(FileNotFoundError):
-                        case_copy_path.unlink()
-                raise
-
-            if not auto_assigned:
-                used_int = _parse_invoice_number(final_number)
-                _ensure_counter_after_use(conn, used_int)
-    except InvoiceNumberConflict:
-        return jsonify({"ok": False, "msg": "Invoice number already exists."}), 409
-    except RuntimeError as exc:
-        return jsonify({"ok": False, "msg": str(exc)}), 503
-    except InvoiceStorageError as exc:
-        return jsonify({"ok": False, "msg": str(exc)}), 500
-    except Exception as exc:  # pragma: no cover - defensive
+                    path.unlink()
+        if reserved:
+            _release_invoice_rows(conn, [final_number], counter_before, counter_after)
+        if isinstance(exc, InvoiceNumberConflict):
+            return jsonify({"ok": False, "msg": "Invoice number already exists."}), 409
+        if isinstance(exc, InvoiceStorageError):
+            return jsonify({"ok": False, "msg": str(exc)}), 500
+        if isinstance(exc, RuntimeError):
+            return jsonify({"ok": False, "msg": str(exc)}), 503
         return jsonify({"ok": False, "msg": f"Failed to save invoice: {exc}"}), 500
 
-    if pdf_bytes is None or primary_path is None or final_number is None:
+    if final_number is None or (want_pdf and primary_path is None):
         return jsonify({"ok": False, "msg": "Invoice could not be generated."}), 500
+    if not want_pdf:
+        return jsonify({"ok": True, "invoice_number": final_number})
 
     response = send_file(
-        BytesIO(pdf_bytes),
+        primary_path,
         mimetype="application/pdf",
         as_attachment=True,
         download_name=primary_path.name,
@@ -2006,6 +2382,92 @@ def invoice_save():
     return response
 
 
+@app.post("/invoice/save_batch")
+@require_login
+def invoice_save_batch():
+    payload = request.get_json(silent=True)
+    entries = payload.get("invoices") if isinstance(payload, dict) else None
+    if not isinstance(entries, list) or not entries or not all(isinstance(e, dict) for e in entries):
+        return jsonify({"ok": False, "msg": "Invalid invoice payload."}), 400
+    if len(entries) > INVOICE_BATCH_LIMIT:
+        return jsonify(
+            {"ok": False, "msg": f"At most {INVOICE_BATCH_LIMIT} invoices can be saved at once."}
+        ), 400
+
+    prepared = [(_invoice_data_from_payload(entry), _invoice_case_fields(entry)) for entry in entries]
+    conn = get_app_db()
+    user_id = g.current_user["id"] if g.get("current_user") else None
+    written: list[Path] = []
+    saved: list[Dict[str, str]] = []
+    reserved: list[str] = []
+    counter_before = counter_after = 0
+
+    try:
+        # Settle every number and insert its row (without a file path) in one
+        # short write transaction, so the renders below run with the
+        # database unlocked while the numbers stay claimed.
+        with conn:
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            counter_before = _get_invoice_counter(conn)
+            for invoice_data, case_fields in prepared:
+                requested_number = invoice_data["invoice_number"]
+                if requested_number:
+                    existing = conn.execute(
+                        "SELECT 1 FROM invoices WHERE invoice_number = ?",
+                        (requested_number,),
+                    ).fetchone()
+                    if existing:
+                        raise InvoiceNumberConflict
+                    _ensure_counter_after_use(conn, _parse_invoice_number(requested_number))
+                else:
+                    invoice_data["invoice_number"] = _reserve_invoice_number(conn)
+                _insert_invoice_row(
+                    conn,
+                    invoice_data["invoice_number"],
+                    *case_fields,
+                    "",
+                    _invoice_record_json(invoice_data, *case_fields),
+                    user_id,
+                )
+            counter_after = _get_invoice_counter(conn)
+        reserved = [invoice_data["invoice_number"] for invoice_data, _ in prepared]
+
+        renders = [generate_invoice_pdf_async(invoice_data) for invoice_data, _ in prepared]
+        for render, (invoice_data, case_fields) in zip(renders, prepared):
+            primary_path, case_copy_path = _store_rendered_invoice(
+                render, invoice_data, *case_fields
+            )
+            written.append(primary_path)
+            if case_copy_path:
+                written.append(case_copy_path)
+            saved.append({
+                "invoice_number": invoice_data["invoice_number"],
+                "path": _invoice_relative_path(primary_path),
+            })
+
+        with conn:
+            conn.executemany(
+                "UPDATE invoices SET file_path = ? WHERE invoice_number = ?",
+                [(entry["path"], entry["invoice_number"]) for entry in saved],
+            )
+    except Exception as exc:
+        for path in written:
+            with suppress(FileNotFoundError):
+                path.unlink()
+        if reserved:
+            _release_invoice_rows(conn, reserved, counter_before, counter_after)
+        if isinstance(exc, InvoiceNumberConflict):
+            return jsonify({"ok": False, "msg": "Invoice number already exists."}), 409
+        if isinstance(exc, InvoiceStorageError):
+            return jsonify({"ok": False, "msg": str(exc)}), 500
+        if isinstance(exc, RuntimeError):
+            return jsonify({"ok": False, "msg": str(exc)}), 503
+        return jsonify({"ok": False, "msg": f"Failed to save invoices: {exc}"}), 500
+
+    return jsonify({"ok": True, "invoices": saved})
+
+
 
 @app.route("/messages", methods=["GET", "POST"])
 @require_login
@@ -2074,7 +2536,7 @@ def messages_home():
                         email_body = "\n".join(email_body_parts)
 
                         try:
-                            future = send_email_async(recipient['email'], email_subject, email_body)
+                            send_email_async(recipient['email'], email_subject, email_body)
                         except EmailConfigError as exc:
                             app.logger.warning("Email notification skipped: %s", exc)
                             flash("Message sent, but notification email could not be delivered (email not configured).", "warning")
@@ -2082,48 +2544,27 @@ def messages_home():
                             app.logger.exception("Failed to queue notification email: %s", exc)
                             flash("Message sent, but notification email could not be queued.", "warning")
                         else:
-                            try:
-                                future.result(timeout=1.0)
-                            except FutureTimeout:
-                                app.logger.info("Notification email queued for message %s", message_id)
-                            except Exception as exc:
-                                app.logger.exception("Failed to send notification email: %s", exc)
-                                flash("Message sent, but notification email failed to send.", "warning")
+                            app.logger.info("Notification email queued for message %s", message_id)
 
                         flash("Message sent.", "success")
                         return redirect(url_for("messages_home", tab="sent"))
         else:
             flash("Unknown action submitted.", "error")
 
-    inbox_rows = list_inbox(user['id'])
+    inbox_rows, g.unread_count = list_inbox_with_unread(user['id'])
     sent_rows = list_sent(user['id'])
-    recipients = [u for u in list_users() if u['is_active'] and u['id'] != user['id']]
+    recipients = list_message_recipients(user['id'])
     smtp_locked = False
 
-    try:
-        return render_template(
-            "messages.html",
-            tab=tab,
-            inbox=inbox_rows,
-            sent=sent_rows,
-            recipients=recipients,
-            draft=draft,
-            smtp_locked=smtp_locked,
-        )
-    except Exception:
-        return render_template_string(
-            """
-            <!doctype html><title>Messages</title>
-            <h1>Messages</h1>
-            <p>This feature requires HTML templates. Inbox entries: {{ inbox|length }}</p>
-            """,
-            tab=tab,
-            inbox=inbox_rows,
-            sent=sent_rows,
-            recipients=recipients,
-            draft=draft,
-            smtp_locked=smtp_locked,
-        )
+    return render_template(
+        "messages.html",
+        tab=tab,
+        inbox=inbox_rows,
+        sent=sent_rows,
+        recipients=recipients,
+        draft=draft,
+        smtp_locked=smtp_locked,
+    )
 
 
 @app.route("/messages/<int:message_id>")
@@ -2139,23 +2580,8 @@ def message_detail(message_id: int):
     if message['recipient_id'] == user['id'] and not message['is_read']:
         mark_message_read(message_id, user['id'])
         message['is_read'] = 1
-        try:
-            g.unread_count = count_unread(user['id'])
-        except Exception:
-            pass
 
-    try:
-        return render_template("message_detail.html", message=message)
-    except Exception:
-        return render_template_string(
-            """
-            <!doctype html><title>Message</title>
-            <h1>{{ message.subject or 'No subject' }}</h1>
-            <p>From: {{ message.sender_email }} | To: {{ message.recipient_email }}</p>
-            <pre>{{ message.body }}</pre>
-            """,
-            message=message,
-        )
+    return render_template("message_detail.html", message=message)
 
 
 @app.post("/messages/<int:message_id>/delete")
@@ -2179,16 +2605,26 @@ def delete_message_action(message_id: int):
     return redirect(url_for("messages_home", tab=tab))
 
 
+_SMTP_SETTING_DEFAULTS: Dict[str, Any] = {
+    "smtp_host": "",
+    "smtp_port": 587,
+    "smtp_username": "",
+    "smtp_use_tls": True,
+    "smtp_from_email": "",
+}
+
+
 @app.route("/settings", methods=["GET", "POST"])
 @require_admin
 def admin_settings():
     global FS_ROOT
 
     if request.method == "POST":
-        form_name = request.form.get("form_name") or ""
+        form = request.form
+        form_name = form.get("form_name") or ""
 
         if form_name == "fs_root":
-            path_input = (request.form.get("fs_root") or "").strip()
+            path_input = _form_text(form, "fs_root")
             if not path_input:
                 flash("Storage path is required.", "error")
             else:
@@ -2202,12 +2638,12 @@ def admin_settings():
                     flash(f"Failed to update storage path: {exc}", "error")
 
         elif form_name == "smtp":
-            host = (request.form.get("smtp_host") or "").strip()
-            port_raw = request.form.get("smtp_port") or ""
-            username = (request.form.get("smtp_username") or "").strip()
-            password = request.form.get("smtp_password") or ""
-            use_tls = request.form.get("smtp_use_tls") in {"1", "true", "on"}
-            from_email = (request.form.get("smtp_from_email") or "").strip()
+            host = _form_text(form, "smtp_host")
+            port_raw = form.get("smtp_port") or ""
+            username = _form_text(form, "smtp_username")
+            password = form.get("smtp_password") or ""
+            use_tls = form.get("smtp_use_tls") in {"1", "true", "on"}
+            from_email = _form_text(form, "smtp_from_email")
 
             errors = []
             if not host:
@@ -2226,11 +2662,12 @@ def admin_settings():
                 for err in errors:
                     flash(err, "error")
             else:
-                settings_manager.set("smtp_host", host)
-                settings_manager.set("smtp_port", port)
-                settings_manager.set("smtp_username", username)
-                settings_manager.set("smtp_use_tls", use_tls)
-                settings_manager.set("smtp_from_email", from_email)
+                with settings_manager:
+                    settings_manager.set("smtp_host", host)
+                    settings_manager.set("smtp_port", port)
+                    settings_manager.set("smtp_username", username)
+                    settings_manager.set("smtp_use_tls", use_tls)
+                    settings_manager.set("smtp_from_email", from_email)
                 if password:
                     try:
                         settings_manager.set_secret("smtp_password", password)
@@ -2241,9 +2678,9 @@ def admin_settings():
                 flash("SMTP configuration updated.", "success")
 
         elif form_name == "create_user":
-            email = normalize_ws(request.form.get("user_email") or "")
-            role = (request.form.get("user_role") or "user").lower()
-            password = request.form.get("user_password") or ""
+            email = normalize_ws(form.get("user_email") or "")
+            role = (form.get("user_role") or "user").lower()
+            password = form.get("user_password") or ""
 
             if role not in {"admin", "user"}:
                 flash("Invalid role specified.", "error")
@@ -2259,11 +2696,8 @@ def admin_settings():
                     flash(f"Failed to create user: {exc}", "error")
 
         elif form_name == "toggle_user":
-            try:
-                target_id = int(request.form.get("user_id", "0"))
-            except ValueError:
-                target_id = 0
-            new_state = request.form.get("new_state") == "1"
+            target_id = _form_int(form, "user_id")
+            new_state = form.get("new_state") == "1"
             target_user = get_user_by_id(target_id)
             if not target_user:
                 flash("User not found.", "error")
@@ -2279,16 +2713,13 @@ def admin_settings():
                     flash(f"Failed to update user status: {exc}", "error")
 
         elif form_name == "update_user":
-            try:
-                target_id = int(request.form.get("user_id", "0"))
-            except ValueError:
-                target_id = 0
+            target_id = _form_int(form, "user_id")
             target_user = get_user_by_id(target_id)
             if not target_user:
                 flash("User not found.", "error")
             else:
-                new_email = normalize_ws(request.form.get("new_email") or "").lower()
-                new_role = (request.form.get("new_role") or target_user['role']).lower()
+                new_email = normalize_ws(form.get("new_email") or "").lower()
+                new_role = (form.get("new_role") or target_user['role']).lower()
                 if new_role not in {"admin", "user"}:
                     flash("Invalid role selected.", "error")
                 else:
@@ -2313,10 +2744,7 @@ def admin_settings():
                         flash(f"Failed to update user: {exc}", "error")
 
         elif form_name == "reset_password_user":
-            try:
-                target_id = int(request.form.get("user_id", "0"))
-            except ValueError:
-                target_id = 0
+            target_id = _form_int(form, "user_id")
             target_user = get_user_by_id(target_id)
             if not target_user or not target_user['is_active']:
                 flash("Only active users can receive reset emails.", "error")
@@ -2330,34 +2758,27 @@ def admin_settings():
                         f"Use the link below to set a new password: {reset_link}\n\n"
                         "If you were not expecting this, please contact the administrator immediately."
                     )
-                    future = send_email_async(target_user['email'], "Case Organizer password reset", body)
+                    send_email_async(target_user['email'], "Case Organizer password reset", body)
                 except EmailConfigError:
                     flash("SMTP settings are incomplete. Configure email before sending resets.", "error")
                 except Exception as exc:
                     flash(f"Failed to queue reset email: {exc}", "error")
                 else:
-                    try:
-                        future.result(timeout=1.0)
-                    except FutureTimeout:
-                        app.logger.info("Admin-triggered reset email queued for %s", target_user['email'])
-                        flash("Password reset email queued.", "success")
-                    except Exception as exc:
-                        app.logger.exception("Failed to send reset email: %s", exc)
-                        flash(f"Failed to send reset email: {exc}", "error")
-                    else:
-                        flash("Password reset email sent.", "success")
+                    app.logger.info("Admin-triggered reset email queued for %s", target_user['email'])
+                    flash("Password reset email queued.", "success")
 
         else:
             flash("Unknown action submitted.", "error")
 
     fs_value = str(FS_ROOT) if FS_ROOT else (config.FS_ROOT or "")
 
+    stored = settings_manager.get_many(_SMTP_SETTING_DEFAULTS)
     smtp_config = {
-        "host": settings_manager.get("smtp_host", ""),
-        "port": settings_manager.get("smtp_port", 587),
-        "username": settings_manager.get("smtp_username", ""),
-        "use_tls": bool(settings_manager.get("smtp_use_tls", True)),
-        "from_email": settings_manager.get("smtp_from_email", ""),
+        "host": stored["smtp_host"],
+        "port": stored["smtp_port"],
+        "username": stored["smtp_username"],
+        "use_tls": bool(stored["smtp_use_tls"]),
+        "from_email": stored["smtp_from_email"],
     }
 
     try:
@@ -2366,25 +2787,16 @@ def admin_settings():
         smtp_password_configured = bool(settings_manager.get("smtp_password"))
 
     users = list_users()
-    active_admins = [u for u in users if u['role'] == 'admin' and u['is_active']]
-    last_active_admin_id = active_admins[0]['id'] if len(active_admins) == 1 else None
-
-    try:
-        return render_template(
-            "settings.html",
-            fs_root=fs_value,
-            smtp=smtp_config,
-            smtp_password_configured=smtp_password_configured,
-            users=users,
-            last_active_admin_id=last_active_admin_id,
-        )
-    except Exception:
-        return render_template_string("""
-            <!doctype html><title>Settings</title>
-            <h1>Admin Settings (fallback)</h1>
-            <p>Storage root: {{ fs_root }}</p>
-            <p>SMTP host: {{ smtp.host }}</p>
-        """, fs_root=fs_value, smtp=smtp_config)
+    last_active_admin_id = get_sole_active_admin_id()
+
+    return render_template(
+        "settings.html",
+        fs_root=fs_value,
+        smtp=smtp_config,
+        smtp_password_configured=smtp_password_configured,
+        users=users,
+        last_active_admin_id=last_active_admin_id,
+    )
 
 # ---- Create Case --------------------------------------------------------
 @app.post("/create-case")
@@ -2470,12 +2882,15 @@ def manage_case_upload():
     if not cdir.exists():
         return jsonify({"ok": False, "msg": "Case directory does not exist. Create the case first."}), 400
 
-    # Helper: safe original base (without extension)
-    def safe_stem(filename: str) -> str:
-        base = Path(secure_filename(filename)).stem
+    # Helper: safe original base (without extension) of a secure_filename() result
+    def safe_stem(safe_name: str) -> str:
+        base = Path(safe_name).stem
         return re.sub(r"\s+", " ", base).strip()
 
     saved_paths = []
+    # Temp names only need to be unique per request; files are moved into
+    # place one at a time, so a single timestamp serves the whole batch.
+    upload_ts = time.time_ns()
 
     # ---------- NEW: Case Law handling ----------
     if domain.lower() == "case law":
@@ -2488,26 +2903,19 @@ def manage_case_upload():
             if not allowed_file(f.filename):
                 continue
 
-            ext = f.filename.rsplit(".", 1)[1].lower()
+            ext = f.filename.rpartition(".")[2].lower()
+            safe_name = secure_filename(f.filename)
 
             # Filename = Main Type (as typed) OR fallback to original stem
-            base = (main_type or "").strip() or safe_stem(f.filename)
+            base = (main_type or "").strip() or safe_stem(safe_name)
             # sanitize whitespace
             base = re.sub(r"\s+", " ", base).strip()
             new_name = f"{base}.{ext}"
 
-            tmp = target_dir / secure_filename(f"_upload_{datetime.now().timestamp()}_{secure_filename(f.filename)}")
-            f.save(tmp)
+            tmp = target_dir / f"_upload_{upload_ts}_{safe_name}"
+            f.save(tmp, buffer_size=UPLOAD_BUFFER_SIZE)
             dest = target_dir / new_name
-
-            final_dest = dest
-            counter = 1
-            while final_dest.exists():
-                final_dest = target_dir / (dest.stem + f"_{counter}" + dest.suffix)
-                counter += 1
-
-            shutil.copyfile(tmp, final_dest)
-            tmp.unlink(missing_ok=True)
+            final_dest = _move_to_unique_path(tmp, target_dir, dest.stem, dest.suffix)
             saved_paths.append(str(final_dest))
 
         if not saved_paths:
@@ -2526,30 +2934,23 @@ def manage_case_upload():
         if not allowed_file(f.filename):
             continue
 
-        ext = f.filename.rsplit(".", 1)[1].lower()
+        ext = f.filename.rpartition(".")[2].lower()
+        safe_name = secure_filename(f.filename)
 
         # Naming rules:
         # - If subcategory is "Primary Documents" OR main_type is empty => keep original name, append " - {Case Name}"
         # - Else => use the typed scheme "(DDMMYYYY) TYPE DOMAIN CaseName.ext"
         is_primary_docs = subcategory and subcategory.strip().lower() == "primary documents"
         if is_primary_docs or not main_type:
-            base = safe_stem(f.filename)
+            base = safe_stem(safe_name)
             new_name = f"{base} - {case_name}.{ext}"
         else:
             new_name = build_filename(dt, main_type, domain, case_name, ext)
 
-        tmp = target_dir / secure_filename(f"_upload_{datetime.now().timestamp()}_{secure_filename(f.filename)}")
-        f.save(tmp)
+        tmp = target_dir / f"_upload_{upload_ts}_{safe_name}"
+        f.save(tmp, buffer_size=UPLOAD_BUFFER_SIZE)
         dest = target_dir / new_name
-
-        final_dest = dest
-        counter = 1
-        while final_dest.exists():
-            final_dest = target_dir / (dest.stem + f"_{counter}" + dest.suffix)
-            counter += 1
-
-        shutil.copyfile(tmp, final_dest)
-        tmp.unlink(missing_ok=True)
+        final_dest = _move_to_unique_path(tmp, target_dir, dest.stem, dest.suffix)
         saved_paths.append(str(final_dest))
 
     if not saved_paths:
@@ -2559,6 +2960,19 @@ def manage_case_upload():
 
 # ---- Safe file serving (whitelist FS_ROOT) ------------------------------
 
+def _send_stored_file(path: Path, as_attachment: bool):
+    response = send_file(
+        path,
+        as_attachment=as_attachment,
+        conditional=True,
+        etag=True,
+        max_age=FILE_CACHE_MAX_AGE,
+    )
+    # Case files are per-user data: let the browser cache them, not proxies.
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
 @app.get("/static-serve")
 def static_serve():
     raw = request.args.get("path", "")
@@ -2567,13 +2981,52 @@ def static_serve():
         path = Path(raw).resolve(strict=True)
     except Exception:
         return "Not found", 404
-    root = FS_ROOT.resolve()
-    if not str(path).startswith(str(root)) or not path.is_file():
+    if not _within_fs_root(path) or not path.is_file():
         return "Not found", 404
-    return send_file(path, as_attachment=download)
+    return _send_stored_file(path, as_attachment=download)
 
 # ---- Search -------------------------------------------------------------
 
+def _iter_search_files(
+    dir_path: str, parts: tuple[str, ...], year: str, month: str, party_lower: str
+) -> Iterable[tuple[os.DirEntry, tuple[str, ...]]]:
+    """Walk FS_ROOT like os.walk, yielding ``(file entry, relative dir parts)``.
+
+    Year, month and case-name (party) filters are applied to the first three
+    path segments before descending, so non-matching subtrees are never
+    listed, and the scandir entries' cached types avoid a stat per file.
+    """
+    depth = len(parts)
+    # Files only match once every filtered segment is part of their path.
+    min_depth = 3 if party_lower else 2 if month else 1 if year else 0
+    try:
+        with os.scandir(dir_path) as it:
+            entries = list(it)
+    except OSError:
+        return
+    subdirs = []
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if is_dir:
+            subdirs.append(entry)
+        elif depth >= min_depth:
+            yield entry, parts
+    for entry in subdirs:
+        name = entry.name
+        if depth == 0 and year and name != year:
+            continue
+        if depth == 1 and month and name != month:
+            continue
+        if depth == 2 and party_lower and party_lower not in name.lower():
+            continue
+        if entry.is_symlink():
+            continue
+        yield from _iter_search_files(entry.path, parts + (name,), year, month, party_lower)
+
+
 @app.get("/search")
 def search():
     """
@@ -2603,17 +3056,32 @@ def search():
     if not FS_ROOT.exists():
         return jsonify({"results": results})
 
-    # Helper: yield candidate month directories given year/month filters
+    q_lower = q.lower()
+    party_lower = party.lower()
+
+    # Helper: yield (path, path relative to FS_ROOT) for candidate month
+    # directories given year/month filters
     def month_dirs():
-        root = FS_ROOT
-        years = [FS_ROOT / year] if year else [d for d in root.iterdir() if d.is_dir()]
+        root = str(FS_ROOT)
+        if year and month:
+            path = os.path.join(root, year, month)
+            if os.path.isdir(path):
+                yield path, os.path.join(year, month)
+            return
+        if year:
+            years = [year] if os.path.isdir(os.path.join(root, year)) else []
+        else:
+            with os.scandir(root) as it:
+                years = [e.name for e in it if e.is_dir()]
         for y in years:
-            if not y.is_dir():
-                continue
-            months = [y / month] if month else [d for d in y.iterdir() if d.is_dir()]
+            y_path = os.path.join(root, y)
+            if month:
+                months = [month] if os.path.isdir(os.path.join(y_path, month)) else []
+            else:
+                with os.scandir(y_path) as it:
+                    months = [e.name for e in it if e.is_dir()]
             for m in months:
-                if m.is_dir():
-                    yield m  # e.g., fs-files/2025/Jan
+                yield os.path.join(y_path, m), os.path.join(y, m)  # e.g., fs-files/2025/Jan
 
     # HARD RULE: if domain is given but subcategory is missing -> force empty
     if domain and not subcat:
@@ -2623,89 +3091,66 @@ def search():
     if subcat:
         subcat_lower = subcat.lower()
 
-        for mdir in month_dirs():
+        for mdir, mdir_rel in month_dirs():
             # case directories: fs-files/YYYY/Mon/<Case Name>
-            for case_dir_path in mdir.iterdir():
-                if not case_dir_path.is_dir():
-                    continue
-
-                case_name = case_dir_path.name  # "Petitioner v. Respondent"
+            with os.scandir(mdir) as it:
+                case_entries = [e for e in it if e.is_dir()]
+            for case_entry in case_entries:
+                case_name = case_entry.name  # "Petitioner v. Respondent"
 
                 # party filter against case folder name
-                if party and party.lower() not in case_name.lower():
+                if party_lower and party_lower not in case_name.lower():
                     continue
 
                 # locate a child directory whose name matches subcategory (case-insensitive)
-                target = None
-                for child in case_dir_path.iterdir():
-                    if child.is_dir() and child.name.lower() == subcat_lower:
-                        target = child
-                        break
+                with os.scandir(case_entry.path) as it:
+                    target = next(
+                        (c for c in it if c.name.lower() == subcat_lower and c.is_dir()),
+                        None,
+                    )
                 if target is None:
                     continue  # this case has no such subcategory folder
+                rel_dir = os.path.join(mdir_rel, case_name, target.name)
 
                 # list allowed files inside that subcategory folder (non-recursive)
-                for name in sorted(os.listdir(target)):
-                    p = target / name
-                    if not p.is_file():
-                        continue
-                    if "." not in name:
-                        continue
-                    ext = name.rsplit(".", 1)[1].lower()
-                    if ext not in ALLOWED_EXTENSIONS:
+                with os.scandir(target.path) as it:
+                    file_entries = sorted((e for e in it if e.is_file()), key=lambda e: e.name)
+                for entry in file_entries:
+                    name = entry.name
+                    _, dot, ext = name.rpartition(".")
+                    if not dot or ext.lower() not in ALLOWED_EXTENSIONS:
                         continue
 
-                    rel = p.relative_to(FS_ROOT)
+                    rel = os.path.join(rel_dir, name)
                     # optional q filter against relative path text
-                    if q and (q.lower() not in str(rel).lower()):
+                    if q_lower and (q_lower not in rel.lower()):
                         continue
 
                     results.append({
                         "file": name,
-                        "path": str(p),
-                        "rel":  str(rel),
+                        "path": entry.path,
+                        "rel":  rel,
                     })
 
         return jsonify({"results": results})
 
     # FALLBACK: no subcategory provided -> optional broad search
     # (Only if user didn't specify domain; if domain is provided we already early-returned empty)
-    for root, dirs, files in os.walk(FS_ROOT):
-        # Apply year/month filters by relative path segments
-        try:
-            rel = Path(root).relative_to(FS_ROOT)
-            parts = rel.parts  # e.g., ('2025','Jan','Case Name', 'Some Subdir'...)
-        except Exception:
-            parts = ()
-
-        if year and (len(parts) < 1 or parts[0] != year):
-            continue
-        if month and (len(parts) < 2 or parts[1] != month):
+    for entry, parts in _iter_search_files(str(FS_ROOT), (), year, month, party_lower):
+        name = entry.name
+        _, dot, ext = name.rpartition(".")
+        if not dot or ext.lower() not in ALLOWED_EXTENSIONS:
             continue
+        rel_file = os.sep.join(parts + (name,))
 
-        # party filter checks the Case Name when available (3rd segment)
-        if party:
-            case_seg = parts[2] if len(parts) >= 3 else ""
-            if party.lower() not in case_seg.lower():
-                continue
-
-        for name in files:
-            if "." not in name:
-                continue
-            ext = name.rsplit(".", 1)[1].lower()
-            if ext not in ALLOWED_EXTENSIONS:
-                continue
-            p = Path(root) / name
-            rel_file = p.relative_to(FS_ROOT)
-
-            if q and (q.lower() not in str(rel_file).lower()):
-                continue
+        if q_lower and (q_lower not in rel_file.lower()):
+            continue
 
-            results.append({
-                "file": name,
-                "path": str(p),
-                "rel":  str(rel_file),
-            })
+        results.append({
+            "file": name,
+            "path": entry.path,
+            "rel":  rel_file,
+        })
 
     return jsonify({"results": results})
 
@@ -2726,8 +3171,7 @@ def api_delete_file():
             return jsonify({"ok": False, "msg": "Missing 'path'"}), 400
 
         target = Path(raw).resolve(strict=True)
-        root = FS_ROOT.resolve()
-        if not str(target).startswith(str(root)):
+        if not _within_fs_root(target):
             return jsonify({"ok": False, "msg": "Not found"}), 404
         if not target.is_file():
             return jsonify({"ok": False, "msg": "Not a file"}), 400
@@ -2824,9 +3268,9 @@ def case_law_upload():
     case_dir = ensure_unique_path(base_dir / safe_case_name)
     case_dir.mkdir(exist_ok=False)
 
-    tmp_name = secure_filename(f"upload_{datetime.now().timestamp()}_{upload.filename}")
+    tmp_name = secure_filename(f"upload_{time.time_ns()}_{upload.filename}")
     tmp_path = case_dir / tmp_name
-    upload.save(tmp_path)
+    text_sha = _save_upload_sha256(upload, tmp_path)
 
     target_file = case_dir / f"{safe_case_name}.{ext}"
     target_file = ensure_unique_path(target_file)
@@ -2842,12 +3286,12 @@ def case_law_upload():
         "Note": note_text,
         "Saved At": datetime.now().isoformat(timespec="seconds"),
     }
-    note_json = json.dumps(note_payload, indent=2)
+    note_bytes = _json_dumps_indented(note_payload)
+    note_json = note_bytes.decode("utf-8")
 
     note_file = case_dir / "note.json"
-    note_file.write_text(note_json, encoding="utf-8")
+    note_file.write_bytes(note_bytes)
 
-    judgement_text = extract_text_for_index(target_file)
     folder_rel = str(case_dir.relative_to(FS_ROOT))
     note_rel = str(note_file.relative_to(FS_ROOT))
 
@@ -2856,8 +3300,9 @@ def case_law_upload():
             """
             INSERT INTO case_law (
                 petitioner, respondent, citation, decision_year, decision_month,
-                primary_type, subtype, folder_rel, file_name, note_path_rel, note_text
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                primary_type, subtype, folder_rel, file_name, note_path_rel, note_text,
+                text_sha
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (
                 petitioner,
@@ -2871,13 +3316,16 @@ def case_law_upload():
                 target_file.name,
                 note_rel,
                 note_text,
+                text_sha,
             ),
         )
         case_id = cur.lastrowid
+        # Parties, citation and note are searchable at once; the judgment
+        # text is added by enqueue_case_law_indexing once extracted.
         refresh_case_law_index(
             conn,
             case_id,
-            judgement_text,
+            "",
             petitioner,
             respondent,
             citation,
@@ -2887,6 +3335,9 @@ def case_law_upload():
     except Exception as exc:
         shutil.rmtree(case_dir, ignore_errors=True)
         raise exc
+    invalidate_case_law_years()
+
+    enqueue_case_law_indexing(case_id, target_file, text_sha)
 
     return jsonify({
         "ok": True,
@@ -2894,13 +3345,83 @@ def case_law_upload():
         "folder": folder_rel,
         "file": target_file.name,
         "note": note_rel,
-    })
+        "indexing": True,
+    }), 202
+
+
+_CASE_LAW_SEARCH_FIELDS = ", ".join([
+    "c.id",
+    "c.petitioner",
+    "c.respondent",
+    "c.citation",
+    "c.decision_year",
+    "c.decision_month",
+    "c.primary_type",
+    "c.subtype AS case_type",
+    "c.folder_rel",
+    "c.file_name",
+    "c.note_path_rel",
+    "c.note_text",
+    "c.created_at",
+    "c.updated_at",
+])
+
+
+@lru_cache(maxsize=64)
+def _case_law_search_sql(join_fts: bool, where: tuple[str, ...]) -> str:
+    """Build the search statement for one filter shape.
+
+    Equal shapes always yield the identical string, which is what sqlite3's
+    per-connection statement cache keys on.
+    """
+    order = "c.decision_year DESC, c.created_at DESC"
+    if join_fts:
+        # Driving the join from the MATCH keeps the FTS index as the outer
+        # loop; the categorical filters below then only see matching rows.
+        # Text searches rank by relevance and carry the matched passage of
+        # the judgment as the preview.
+        sql = (
+            f"SELECT {_CASE_LAW_SEARCH_FIELDS},"
+            " snippet(case_law_fts, 0, '', '', '…', 20) AS fts_content"
+            " FROM case_law_fts JOIN case_law c ON c.id = case_law_fts.rowid"
+            " WHERE case_law_fts MATCH ?"
+        )
+        if where:
+            sql += " AND " + " AND ".join(where)
+        order = "bm25(case_law_fts), " + order
+    else:
+        sql = f"SELECT {_CASE_LAW_SEARCH_FIELDS}, '' AS fts_content FROM case_law c"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+
+    return f"{sql} ORDER BY {order} LIMIT ?"
+
+
+def case_law_filters(conn: sqlite3.Connection) -> Dict[str, Any]:
+    return {
+        "years": case_law_years(conn),
+        "primary_types": list(CASE_LAW_PRIMARY_TYPES),
+        "case_types": CASE_LAW_CASE_TYPES,
+    }
+
+
+@app.get("/case-law/filters")
+def case_law_filters_view():
+    if not FS_ROOT:
+        return jsonify({})
+    filters = case_law_filters(get_case_law_db())
+    response = jsonify(filters)
+    # The option lists only change when a new decision year appears, so the
+    # search page can revalidate them with a 304 instead of re-downloading.
+    response.add_etag()
+    return response.make_conditional(request)
 
 
 @app.get("/case-law/search")
 def case_law_search():
+    include_filters = request.args.get("include_filters") in {"1", "true", "yes"}
     if not FS_ROOT:
-        return jsonify({"results": [], "filters": {}})
+        return jsonify({"results": [], "filters": {}} if include_filters else {"results": []})
 
     conn = get_case_law_db()
     params: list[Any] = []
@@ -2914,7 +3435,6 @@ def case_law_search():
         if not fts_query:
             return jsonify({"results": []})
         join_fts = True
-        where.append("c.id IN (SELECT rowid FROM case_law_fts WHERE case_law_fts MATCH ?)")
         params.append(fts_query)
 
     party_raw = normalize_ws(request.args.get("party") or "")
@@ -2968,47 +3488,15 @@ def case_law_search():
         limit = 50
     limit = max(1, min(limit, 200))
 
-    select_fields = [
-        "c.id",
-        "c.petitioner",
-        "c.respondent",
-        "c.citation",
-        "c.decision_year",
-        "c.decision_month",
-        "c.primary_type",
-        "c.subtype AS case_type",
-        "c.folder_rel",
-        "c.file_name",
-        "c.note_path_rel",
-        "c.note_text",
-        "c.created_at",
-        "c.updated_at",
-    ]
-
-    select_fields.append("'' AS fts_content")
-
-    sql = "SELECT " + ", ".join(select_fields) + " FROM case_law c"
-
-    if where:
-        sql += " WHERE " + " AND ".join(where)
-
-    sql += " ORDER BY c.decision_year DESC, c.created_at DESC LIMIT ?"
     params.append(limit)
-
-    rows = conn.execute(sql, params).fetchall()
+    rows = conn.execute(_case_law_search_sql(join_fts, tuple(where)), params).fetchall()
     results = [
         serialize_case_law(row, row["fts_content"]) for row in rows
     ]
 
-    years = [r[0] for r in conn.execute("SELECT DISTINCT decision_year FROM case_law ORDER BY decision_year DESC").fetchall()]
-    return jsonify({
-        "results": results,
-        "filters": {
-            "years": years,
-            "primary_types": list(CASE_LAW_PRIMARY_TYPES),
-            "case_types": CASE_LAW_CASE_TYPES,
-        },
-    })
+    if include_filters:
+        return jsonify({"results": results, "filters": case_law_filters(conn)})
+    return jsonify({"results": results})
 
 
 @app.delete("/case-law/<int:case_id>")
@@ -3038,9 +3526,17 @@ def case_law_delete(case_id: int):
     try:
         conn.execute("DELETE FROM case_law WHERE id = ?", (case_id,))
         conn.execute("DELETE FROM case_law_fts WHERE rowid = ?", (case_id,))
+        text_sha = row["text_sha"]
+        if text_sha:
+            conn.execute(
+                "DELETE FROM text_cache WHERE sha = ? "
+                "AND NOT EXISTS (SELECT 1 FROM case_law WHERE text_sha = ?)",
+                (text_sha, text_sha),
+            )
         conn.commit()
     except Exception as exc:
         return case_law_error(f"Failed to remove database record: {exc}", 500)
+    invalidate_case_law_years()
 
     return jsonify({"ok": True, "deleted_id": case_id})
 
@@ -3063,7 +3559,7 @@ def case_law_download(case_id: int):
     if not file_path.exists():
         return "Not found", 404
 
-    return send_file(file_path, as_attachment=True)
+    return _send_stored_file(file_path, as_attachment=True)
 
 
 @app.route("/case-law/<int:case_id>/note", methods=["GET", "POST"])
@@ -3096,18 +3592,22 @@ def case_law_note(case_id: int):
     note_path.parent.mkdir(parents=True, exist_ok=True)
     note_path.write_text(content, encoding="utf-8")
 
-    judgement_row = conn.execute("SELECT content FROM case_law_fts WHERE rowid = ?", (case_id,)).fetchone()
-    judgement_text = judgement_row["content"] if judgement_row else ""
-
-    refresh_case_law_index(
-        conn,
-        case_id,
-        judgement_text,
-        row["petitioner"],
-        row["respondent"],
-        row["citation"],
-        content,
-    )
+    # Only the note column is written so judgment text indexed in the
+    # background meanwhile is never overwritten with a stale copy.
+    updated = conn.execute(
+        "UPDATE case_law_fts SET note = ? WHERE rowid = ?",
+        (content, case_id),
+    ).rowcount
+    if not updated:
+        refresh_case_law_index(
+            conn,
+            case_id,
+            "",
+            row["petitioner"],
+            row["respondent"],
+            row["citation"],
+            content,
+        )
 
     conn.execute(
         "UPDATE case_law SET note_text = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
@@ -3130,24 +3630,30 @@ def api_dir_tree():
       { "dirs": [names], "files": [ {name, path} ] }
     """
     rel = (request.args.get("path") or "").strip()
-    base = FS_ROOT
     try:
+        root = str(_resolved_fs_root())
+        base = root
         if rel:
-            base = (FS_ROOT / rel).resolve()
-            # enforce FS_ROOT jail
-            if not str(base).startswith(str(FS_ROOT.resolve())):
+            # enforce FS_ROOT jail; realpath resolves symlinks so a link
+            # under FS_ROOT cannot point the listing outside it
+            base = os.path.realpath(os.path.join(root, rel))
+            if base != root and not base.startswith(root + os.sep):
                 return jsonify({"dirs": [], "files": []})
-        if not base.exists() or not base.is_dir():
+        if not os.path.isdir(base):
             return jsonify({"dirs": [], "files": []})
 
         dirs = []
         files = []
-        for entry in sorted(base.iterdir(), key=lambda p: p.name.lower()):
+        with os.scandir(base) as it:
+            entries = sorted(it, key=lambda e: e.name.lower())
+        for entry in entries:
+            name = entry.name
             if entry.is_dir():
-                dirs.append(entry.name)
+                dirs.append(name)
             elif entry.is_file():
-                if "." in entry.name and entry.name.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS:
-                    files.append({"name": entry.name, "path": str(entry)})
+                _, dot, ext = name.rpartition(".")
+                if dot and ext.lower() in ALLOWED_EXTENSIONS:
+                    files.append({"name": name, "path": entry.path})
         return jsonify({"dirs": dirs, "files": files})
     except Exception as e:
         return jsonify({"dirs": [], "files": [], "error": str(e)}), 500
@@ -3160,8 +3666,7 @@ def api_update_note(year, month, case_name):
     note_path = cdir / "Note.json"
 
     if not note_path.exists():
-        template = make_note_json({})
-        return jsonify({"ok": False, "msg": "Note.json not found", "template": template}), 404
+        return jsonify({"ok": False, "msg": "Note.json not found", "template": _EMPTY_NOTE_TEMPLATE}), 404
 
     data = request.get_json(silent=True) or {}
     content = data.get("content", "")
@@ -3192,8 +3697,7 @@ def api_create_note():
         return jsonify({"ok": False, "msg": "Year, month, and case are required"}), 400
 
     cdir = (FS_ROOT / year / month / case).resolve()
-    root = FS_ROOT.resolve()
-    if not str(cdir).startswith(str(root)):
+    if not _within_fs_root(cdir):
         return jsonify({"ok": False, "msg": "Invalid path"}), 400
     if not cdir.exists():
         return jsonify({"ok": False, "msg": "Case folder not found"}), 404
@@ -3227,12 +3731,11 @@ def api_note(year, month, case_name):
     cdir = FS_ROOT / year / month / case_name
     note_path = cdir / "Note.json"
     if not note_path.exists():
-        template = make_note_json({})
-        return jsonify({"ok": False, "msg": "Note.json not found", "template": template}), 404
+        return jsonify({"ok": False, "msg": "Note.json not found", "template": _EMPTY_NOTE_TEMPLATE}), 404
 
     if request.method == "GET":
-        content = note_path.read_text(encoding="utf-8")
-        return jsonify({"ok": True, "content": content, "template": make_note_json({})})
+        content = read_note_text(note_path)
+        return jsonify({"ok": True, "content": content, "template": _EMPTY_NOTE_TEMPLATE})
 
     data = request.get_json(silent=True) or {}
     content = data.get("content", "")
@@ -28,7 +28,7 @@ SECRET_KEY = (
     or "dev-local-secret-key"
 )
 
-ALLOWED_EXTENSIONS = {"pdf", "docx", "txt", "png", "jpg", "jpeg", "json"}
+ALLOWED_EXTENSIONS = frozenset({"pdf", "docx", "txt", "png", "jpg", "jpeg", "json"})
 
 
 def save_fs_root(path_str: str) -> None:
@@ -1,11 +0,0 @@
-"""Service layer helpers for Case Organizer 2.0."""
-
-from . import security, db, settings, users, email  # noqa: F401
-
-__all__ = [
-    "security",
-    "db",
-    "settings",
-    "users",
-    "email",
-]
@@ -2,8 +2,12 @@
 
 from __future__ import annotations
 
+import queue
+import re
 import sqlite3
+from functools import lru_cache
 from pathlib import Path
+from threading import Lock
 from typing import Optional
 
 from flask import g
@@ -13,11 +17,35 @@ from services.settings import settings_manager
 
 
 # Global schema version for the application database.
-_SCHEMA_VERSION = 2
+_SCHEMA_VERSION = 5
 
+# Statement cache per connection; the invoice and user helpers reuse a small
+# set of SQL strings, so keep them all compiled.
+_STATEMENT_CACHE_SIZE = 256
 
+# WAL is recorded in the database file, so it only needs switching on once per
+# file per process; the remaining pragmas are per-connection and applied on
+# every open.
+_WAL_PRAGMA = "PRAGMA journal_mode = WAL"
+_wal_paths: set[str] = set()
+
+_CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+@lru_cache(maxsize=1)
 def _app_db_path() -> Path:
-    """Return the path for the primary application database."""
+    """Return the path for the primary application database.
+
+    Both inputs are fixed once the settings manager is built, so the path is
+    worked out on first use and reused for every later request.
+    """
     legacy_cfg = getattr(caseorg_config, 'CASEORG_CONFIG', None)
     if legacy_cfg:
         return Path(legacy_cfg).with_name('organizer.db')
@@ -41,7 +69,8 @@ def _ensure_schema(conn: sqlite3.Connection) -> None:
     row = conn.execute(
         "SELECT value FROM app_meta WHERE key = 'schema_version'"
     ).fetchone()
-    current_version = int(row["value"]) if row else 0
+    stored_version = int(row["value"]) if row else 0
+    current_version = stored_version
 
     if current_version < 1:
         _migrate_to_v1(conn)
@@ -51,13 +80,26 @@ def _ensure_schema(conn: sqlite3.Connection) -> None:
         _migrate_to_v2(conn)
         current_version = 2
 
-    if current_version != _SCHEMA_VERSION:
-        # Placeholder for future migrations.
+    if current_version < 3:
+        _migrate_to_v3(conn)
+        current_version = 3
+
+    if current_version < 4:
+        _migrate_to_v4(conn)
+        current_version = 4
+
+    if current_version < 5:
+        _migrate_to_v5(conn)
+        current_version = 5
+
+    if current_version != stored_version:
+        # Record the version so migrations run once, and commit them with it.
         conn.execute(
             "INSERT INTO app_meta(key, value) VALUES('schema_version', ?) "
             "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
             (str(_SCHEMA_VERSION),),
         )
+        conn.commit()
 
 
 def _migrate_to_v1(conn: sqlite3.Connection) -> None:
@@ -193,20 +235,138 @@ def _migrate_to_v2(conn: sqlite3.Connection) -> None:
         """
     )
 
+def _migrate_to_v3(conn: sqlite3.Connection) -> None:
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(invoices)")}
+    if "invoice_number_int" not in columns:
+        conn.execute("ALTER TABLE invoices ADD COLUMN invoice_number_int INTEGER")
+
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_invoices_number_int ON invoices(invoice_number_int)"
+    )
+
+    # Backfill with the same digits-only parse the invoice helpers use.
+    rows = conn.execute(
+        "SELECT id, invoice_number FROM invoices "
+        "WHERE invoice_number GLOB '[0-9]*' AND invoice_number_int IS NULL"
+    ).fetchall()
+    conn.executemany(
+        "UPDATE invoices SET invoice_number_int = ? WHERE id = ?",
+        [(int(re.sub(r"\D", "", row["invoice_number"])), row["id"]) for row in rows],
+    )
+
+
+def _migrate_to_v4(conn: sqlite3.Connection) -> None:
+    # list_inbox_with_unread/list_sent filter on one party and order by newest first;
+    # these let both read the page straight off an index instead of sorting.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_user_messages_sender_created "
+        "ON user_messages(sender_id, created_at DESC)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_user_messages_recipient_created "
+        "ON user_messages(recipient_id, created_at DESC)"
+    )
+
+
+def _migrate_to_v5(conn: sqlite3.Connection) -> None:
+    # At most one outstanding reset token per user, so issuing a new one can be
+    # a single upsert. Keep only the newest outstanding token before enforcing.
+    conn.execute(
+        """
+        DELETE FROM password_resets
+        WHERE consumed_at IS NULL
+          AND id NOT IN (
+              SELECT MAX(id) FROM password_resets
+              WHERE consumed_at IS NULL
+              GROUP BY user_id
+          )
+        """
+    )
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_password_resets_active_user "
+        "ON password_resets(user_id) WHERE consumed_at IS NULL"
+    )
+
+
+def connect_sqlite(path: Path, check_same_thread: bool = True) -> sqlite3.Connection:
+    """Open a SQLite connection with the application's row factory and tuning."""
+    conn = sqlite3.connect(
+        path,
+        cached_statements=_STATEMENT_CACHE_SIZE,
+        check_same_thread=check_same_thread,
+    )
+    conn.row_factory = sqlite3.Row
+    key = str(path)
+    if key not in _wal_paths:
+        conn.execute(_WAL_PRAGMA)
+        _wal_paths.add(key)
+    for pragma in _CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def close_sqlite(conn: sqlite3.Connection) -> None:
+    """Close a connection opened by :func:`connect_sqlite`.
+
+    ``PRAGMA optimize`` is cheap when there is nothing to do and keeps query
+    planner statistics current for short-lived per-request connections.
+    """
+    try:
+        conn.execute("PRAGMA optimize")
+    except sqlite3.Error:
+        pass
+    finally:
+        conn.close()
+
+
+# Idle application-database connections, reused across requests so SQLite's
+# page and statement caches stay warm. A connection is only ever used by one
+# request at a time, which is what makes sharing it between threads safe.
+_APP_DB_POOL_SIZE = 8
+_app_db_pools: dict[str, queue.LifoQueue] = {}
+_app_db_lock = Lock()
+
+
+def _app_db_pool(db_path: Path) -> queue.LifoQueue:
+    key = str(db_path)
+    pool = _app_db_pools.get(key)
+    if pool is None:
+        with _app_db_lock:
+            pool = _app_db_pools.get(key)
+            if pool is None:
+                # First use of this database in the process: bring the schema
+                # up to date once instead of on every request.
+                _ensure_parent_dir(db_path)
+                conn = connect_sqlite(db_path, check_same_thread=False)
+                _ensure_schema(conn)
+                pool = queue.LifoQueue(maxsize=_APP_DB_POOL_SIZE)
+                pool.put_nowait(conn)
+                _app_db_pools[key] = pool
+    return pool
+
+
 def get_app_db() -> sqlite3.Connection:
     """Return a connection to the application database bound to Flask's context."""
     if 'app_db' not in g:
         db_path = _app_db_path()
-        _ensure_parent_dir(db_path)
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        conn.execute('PRAGMA foreign_keys = ON')
-        _ensure_schema(conn)
+        pool = _app_db_pool(db_path)
+        try:
+            conn = pool.get_nowait()
+        except queue.Empty:
+            conn = connect_sqlite(db_path, check_same_thread=False)
         g.app_db = conn
+        g.app_db_pool = pool
     return g.app_db
 
 
 def close_app_db(_: Optional[BaseException]) -> None:
     conn = g.pop('app_db', None)
-    if conn is not None:
-        conn.close()
+    pool = g.pop('app_db_pool', None)
+    if conn is None:
+        return
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        pool.put_nowait(conn)
+    except (sqlite3.Error, queue.Full):
+        close_sqlite(conn)
@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import logging
 import smtplib
+import threading
 import time
 from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
@@ -27,6 +28,7 @@ class _SMTPConfig:
     use_tls: bool
     from_email: str
     timeout_seconds: float
+    debug_timing: bool = False
 
 
 _CACHE_TTL_SECONDS = 300
@@ -35,6 +37,17 @@ _cached_config: Optional[_SMTPConfig] = None
 _cached_loaded_at: float = 0.0
 _EMAIL_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="caseorg-email")
 
+# Each email worker keeps its authenticated SMTP session open between sends so
+# a burst of notifications pays for one TLS handshake and login. Sessions idle
+# longer than this are replaced rather than probed, since servers drop idle
+# clients and a half-open socket would only fail after the full timeout.
+_SMTP_IDLE_SECONDS = 60
+_smtp_local = threading.local()
+
+# Upper bound on timing marks one send can record (config reload, a reconnect
+# and every stage included); later marks are dropped rather than grown into.
+_MAX_TIMING_MARKS = 16
+
 
 def clear_email_cache() -> None:
     """Clear cached SMTP configuration so future sends reload from disk."""
@@ -66,6 +79,7 @@ def _load_smtp_config(
         use_tls = bool(settings_manager.get("smtp_use_tls", True))
         from_email = settings_manager.get("smtp_from_email")
         timeout_raw = settings_manager.get("smtp_timeout_seconds", 10)
+        debug_timing = bool(settings_manager.get("email_debug_timing", False))
 
         if not host or not from_email:
             raise EmailConfigError("SMTP host and from-address must be configured before sending email.")
@@ -115,6 +129,7 @@ def _load_smtp_config(
             use_tls=use_tls,
             from_email=from_email,
             timeout_seconds=timeout_seconds,
+            debug_timing=debug_timing,
         )
         _cached_loaded_at = time.monotonic()
         if timing_hook:
@@ -122,28 +137,105 @@ def _load_smtp_config(
         return _cached_config
 
 
+def _debug_timing_enabled() -> bool:
+    """The email_debug_timing flag, read from the cached config when loaded."""
+    with _config_lock:
+        cached = _cached_config
+    if cached is not None:
+        return cached.debug_timing
+    return bool(settings_manager.get("email_debug_timing", False))
+
+
 def _as_list(recipient: Union[str, Iterable[str]]) -> list[str]:
     if isinstance(recipient, str):
         return [recipient]
     return list(recipient)
 
 
+def _open_smtp(config: _SMTPConfig, mark: Callable[[str], None]) -> smtplib.SMTP:
+    smtp = smtplib.SMTP(config.host, config.port, timeout=config.timeout_seconds)
+    try:
+        mark("connected")
+        if config.use_tls:
+            smtp.starttls()
+            mark("tls_ready")
+        if config.username and config.password:
+            smtp.login(config.username, config.password)
+            mark("authenticated")
+    except Exception:
+        smtp.close()
+        raise
+    return smtp
+
+
+def _drop_worker_smtp() -> None:
+    smtp = getattr(_smtp_local, "smtp", None)
+    _smtp_local.smtp = None
+    if smtp is not None:
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+
+def _send_on_worker_smtp(
+    config: _SMTPConfig, msg: EmailMessage, mark: Callable[[str], None]
+) -> None:
+    """Send ``msg`` over this thread's cached session, reconnecting once if it dropped."""
+    smtp = getattr(_smtp_local, "smtp", None)
+    if smtp is not None and (
+        _smtp_local.config != config
+        or time.monotonic() - _smtp_local.last_used > _SMTP_IDLE_SECONDS
+    ):
+        _drop_worker_smtp()
+        smtp = None
+    reused = smtp is not None
+    if smtp is None:
+        smtp = _open_smtp(config, mark)
+        _smtp_local.smtp = smtp
+        _smtp_local.config = config
+    else:
+        mark("reused")
+    try:
+        smtp.send_message(msg)
+    except smtplib.SMTPServerDisconnected:
+        _smtp_local.smtp = None
+        smtp.close()
+        if not reused:
+            raise
+        try:
+            smtp = _open_smtp(config, mark)
+            _smtp_local.smtp = smtp
+            smtp.send_message(msg)
+        except Exception:
+            _drop_worker_smtp()
+            raise
+    except Exception:
+        _drop_worker_smtp()
+        raise
+    finally:
+        _smtp_local.last_used = time.monotonic()
+
+
 def send_email(
     recipient: Union[str, Iterable[str]],
     subject: str,
     body: str,
     _config: Optional[_SMTPConfig] = None,
+    _keep_alive: bool = False,
 ) -> None:
     logger = logging.getLogger("caseorg.email")
-    timing_enabled = bool(settings_manager.get("email_debug_timing", False))
-    timing_marks: list[tuple[str, float]] = []
+    timing_enabled = _config.debug_timing if _config is not None else _debug_timing_enabled()
+    timing_marks: list[Optional[tuple[str, float]]] = [None] * _MAX_TIMING_MARKS if timing_enabled else []
+    mark_count = 0
 
     def mark(stage: str) -> None:
-        if timing_enabled:
-            timing_marks.append((stage, time.perf_counter()))
+        nonlocal mark_count
+        if timing_enabled and mark_count < _MAX_TIMING_MARKS:
+            timing_marks[mark_count] = (stage, time.perf_counter())
+            mark_count += 1
 
-    if timing_enabled:
-        timing_marks.append(("start", time.perf_counter()))
+    mark("start")
 
     if _config is None:
         mark("before_config")
@@ -167,32 +259,28 @@ def send_email(
     msg.set_content(body)
 
     try:
-        with smtplib.SMTP(config.host, config.port, timeout=config.timeout_seconds) as smtp:
-            mark("connected")
-            if config.use_tls:
-                smtp.starttls()
-                mark("tls_ready")
-            if config.username and config.password:
-                smtp.login(config.username, config.password)
-                mark("authenticated")
-            smtp.send_message(msg)
-            mark("sent")
+        if _keep_alive:
+            _send_on_worker_smtp(config, msg, mark)
+        else:
+            with _open_smtp(config, mark) as smtp:
+                smtp.send_message(msg)
+        mark("sent")
     except Exception as exc:
         print(f"[email] Failed to send message to {recipients}: {exc}")
         raise
     finally:
         mark("completed")
-        if timing_enabled and len(timing_marks) > 1:
-            summary_parts: list[str] = []
-            prev_label, prev_time = timing_marks[0]
-            for label, ts in timing_marks[1:]:
-                summary_parts.append(f"{prev_label}->{label}:{(ts - prev_time)*1000:.0f}ms")
-                prev_label, prev_time = label, ts
-            total = (timing_marks[-1][1] - timing_marks[0][1]) * 1000
+        if mark_count > 1:
+            marks = timing_marks[:mark_count]
+            summary = " ".join(
+                f"{prev[0]}->{cur[0]}:{(cur[1] - prev[1])*1000:.0f}ms"
+                for prev, cur in zip(marks, marks[1:])
+            )
+            total = (marks[-1][1] - marks[0][1]) * 1000
             logger.info(
                 "Email timing to %s | %s | total:%dms",
                 recipients,
-                " ".join(summary_parts),
+                summary,
                 int(total),
             )
 
@@ -209,6 +297,11 @@ def send_email_async(
     subject: str,
     body: str,
 ) -> Future:
+    """Queue an email on the background pool and return immediately.
+
+    Configuration errors are raised synchronously; delivery failures are
+    logged by the future's done-callback, so callers need not wait on it.
+    """
     recipients = _as_list(recipient)
     if not recipients:
         raise ValueError("At least one recipient must be provided")
@@ -216,7 +309,7 @@ def send_email_async(
     config = _load_smtp_config()
 
     def _task() -> None:
-        send_email(recipient, subject, body, _config=config)
+        send_email(recipient, subject, body, _config=config, _keep_alive=True)
 
     future = _EMAIL_EXECUTOR.submit(_task)
     future.add_done_callback(_log_async_result)
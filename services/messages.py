@@ -3,31 +3,64 @@
 from __future__ import annotations
 
 import sqlite3
-from typing import Iterable, List
+from threading import Lock
+from typing import Iterable, List, Optional
 
 from services.db import get_app_db
 
 
+# INSERT ... RETURNING needs SQLite 3.35+.
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+_SQL_INSERT_MESSAGE = """
+    INSERT INTO user_messages(sender_id, recipient_id, subject, body)
+    VALUES(?, ?, ?, ?)
+"""
+
+# Unread counts per recipient for the navbar badge. Every function here that
+# adds, reads or deletes a message drops the affected entries; the generation
+# stops a count that raced such a change from being cached.
+_UNREAD_CACHE_MAX_ENTRIES = 2048
+_unread_lock = Lock()
+_unread_counts: dict[int, int] = {}
+_unread_generation = 0
+
+
+def invalidate_unread_counts(user_ids: Optional[Iterable[int]] = None) -> None:
+    """Drop cached unread counts for ``user_ids`` (or for everyone)."""
+    global _unread_generation
+    with _unread_lock:
+        _unread_generation += 1
+        if user_ids is None:
+            _unread_counts.clear()
+        else:
+            for user_id in user_ids:
+                _unread_counts.pop(int(user_id), None)
+
+
 def create_message(sender_id: int, recipient_id: int, subject: str, body: str) -> int:
     if sender_id == recipient_id:
         raise ValueError("Cannot send a message to yourself")
     conn = get_app_db()
-    cur = conn.execute(
-        """
-        INSERT INTO user_messages(sender_id, recipient_id, subject, body)
-        VALUES(?, ?, ?, ?)
-        """,
-        (sender_id, recipient_id, subject.strip(), body.strip()),
-    )
+    params = (sender_id, recipient_id, subject.strip(), body.strip())
+    if _HAS_RETURNING:
+        message_id = conn.execute(_SQL_INSERT_MESSAGE + " RETURNING id", params).fetchone()[0]
+    else:
+        message_id = conn.execute(_SQL_INSERT_MESSAGE, params).lastrowid
     conn.commit()
-    return int(cur.lastrowid)
+    invalidate_unread_counts((recipient_id,))
+    return int(message_id)
+
 
+def list_inbox_with_unread(user_id: int, limit: int = 50) -> tuple[List[sqlite3.Row], int]:
+    """Return the inbox page and the user's total unread count from one query.
 
-def list_inbox(user_id: int, limit: int = 50) -> List[sqlite3.Row]:
+    The window sum runs over every message addressed to the user before
+    LIMIT applies, so the count is not capped by the page size.
+    """
     conn = get_app_db()
-    return conn.execute(
+    rows = conn.execute(
         """
-        SELECT m.*, u.email AS sender_email
+        SELECT m.*, u.email AS sender_email, SUM(m.is_read = 0) OVER () AS unread
         FROM user_messages m
         JOIN users u ON u.id = m.sender_id
         WHERE m.recipient_id = ?
@@ -36,6 +69,7 @@ def list_inbox(user_id: int, limit: int = 50) -> List[sqlite3.Row]:
         """,
         (user_id, limit),
     ).fetchall()
+    return rows, int(rows[0]["unread"]) if rows else 0
 
 
 def list_sent(user_id: int, limit: int = 50) -> List[sqlite3.Row]:
@@ -54,12 +88,24 @@ def list_sent(user_id: int, limit: int = 50) -> List[sqlite3.Row]:
 
 
 def count_unread(user_id: int) -> int:
+    key = int(user_id)
+    with _unread_lock:
+        count = _unread_counts.get(key)
+        generation = _unread_generation
+    if count is not None:
+        return count
+
     conn = get_app_db()
-    row = conn.execute(
-        "SELECT COUNT(*) AS c FROM user_messages WHERE recipient_id = ? AND is_read = 0",
-        (user_id,),
-    ).fetchone()
-    return int(row["c"] if row else 0)
+    count = conn.execute(
+        "SELECT COUNT(*) FROM user_messages WHERE recipient_id = ? AND is_read = 0",
+        (key,),
+    ).fetchone()[0]
+    with _unread_lock:
+        if generation == _unread_generation:
+            if len(_unread_counts) >= _UNREAD_CACHE_MAX_ENTRIES:
+                _unread_counts.clear()
+            _unread_counts[key] = count
+    return count
 
 
 def mark_message_read(message_id: int, user_id: int) -> None:
@@ -69,6 +115,7 @@ def mark_message_read(message_id: int, user_id: int) -> None:
         (message_id, user_id),
     )
     conn.commit()
+    invalidate_unread_counts((user_id,))
 
 
 def get_message(message_id: int, user_id: int) -> sqlite3.Row | None:
@@ -96,4 +143,7 @@ def delete_message(message_id: int, user_id: int) -> bool:
         (message_id, user_id, user_id),
     )
     conn.commit()
+    if cur.rowcount:
+        # The other party may have been the recipient, so drop every entry.
+        invalidate_unread_counts()
     return cur.rowcount > 0
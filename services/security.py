@@ -2,17 +2,84 @@
 
 from __future__ import annotations
 
-from argon2 import PasswordHasher, exceptions as argon_exc
+import base64
+import hmac
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional
 
-# Argon2 hasher with reasonable defaults
-ph = PasswordHasher()
+from argon2 import Parameters, PasswordHasher, exceptions as argon_exc, extract_parameters, low_level
 
+# Argon2id at OWASP's minimum profile (19 MiB, 2 passes, 1 lane). Hashes made
+# with other parameters still verify and are upgraded on the next login.
+ARGON2_TIME_COST = 2
+ARGON2_MEMORY_COST = 19456  # KiB
+ARGON2_PARALLELISM = 1
+ARGON2_HASH_LEN = 32
 
-def hash_password(plain_text: str) -> str:
-    """Hash the provided password with Argon2."""
+ph = PasswordHasher(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM,
+    hash_len=ARGON2_HASH_LEN,
+)
+
+# argon2-cffi releases the GIL while hashing, so running it on a small pool
+# lets hashes proceed on other cores and bounds how many Argon2 buffers a
+# burst of logins can allocate at once.
+_CRYPTO_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="caseorg-crypto")
+
+
+def hash_password_async(plain_text: str) -> Future:
+    """Start hashing ``plain_text`` on the crypto pool and return its future.
+
+    Callers provisioning several users can submit every hash first and then
+    collect the results, so the hashes run side by side.
+    """
     if not plain_text:
         raise ValueError("Password must not be empty")
-    return ph.hash(plain_text)
+    return _CRYPTO_EXECUTOR.submit(ph.hash, plain_text)
+
+
+def hash_password(plain_text: str) -> str:
+    """Hash the provided password with Argon2."""
+    return hash_password_async(plain_text).result()
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.b64decode(value + "=" * (-len(value) % 4), validate=True)
+
+
+@lru_cache(maxsize=1024)
+def _decode_hash(hashed: str) -> Optional[tuple[Parameters, bytes, bytes]]:
+    """Split a ``$argon2id$v=..$m=..,t=..,p=..$salt$digest`` string once.
+
+    Returns None for encodings this fast path does not handle; those are
+    verified by ``PasswordHasher.verify`` instead.
+    """
+    parts = hashed.split("$")
+    if len(parts) != 6:
+        return None
+    try:
+        params = extract_parameters(hashed)
+        return params, _b64decode(parts[4]), _b64decode(parts[5])
+    except (argon_exc.InvalidHash, ValueError):
+        return None
+
+
+def _verify_decoded(plain_text: str, decoded: tuple[Parameters, bytes, bytes]) -> bool:
+    params, salt, digest = decoded
+    candidate = low_level.hash_secret_raw(
+        plain_text.encode("utf-8"),
+        salt,
+        time_cost=params.time_cost,
+        memory_cost=params.memory_cost,
+        parallelism=params.parallelism,
+        hash_len=len(digest),
+        type=params.type,
+        version=params.version,
+    )
+    return hmac.compare_digest(candidate, digest)
 
 
 def verify_password(plain_text: str, hashed: str) -> bool:
@@ -20,7 +87,20 @@ def verify_password(plain_text: str, hashed: str) -> bool:
     if not plain_text or not hashed:
         return False
 
+    # The decoded salt and parameters are memoised per stored hash, so a
+    # login runs the Argon2 core directly without re-parsing the string.
+    decoded = _decode_hash(hashed)
+    try:
+        if decoded is not None:
+            return _CRYPTO_EXECUTOR.submit(_verify_decoded, plain_text, decoded).result()
+        return _CRYPTO_EXECUTOR.submit(ph.verify, hashed, plain_text).result()
+    except (argon_exc.VerificationError, argon_exc.InvalidHash, argon_exc.HashingError):
+        return False
+
+
+def password_needs_rehash(hashed: str) -> bool:
+    """True when ``hashed`` was made with parameters other than the current ones."""
     try:
-        return ph.verify(hashed, plain_text)
-    except (argon_exc.VerificationError, argon_exc.InvalidHash):
+        return ph.check_needs_rehash(hashed)
+    except argon_exc.InvalidHash:
         return False
@@ -3,18 +3,52 @@
 from __future__ import annotations
 
 import base64
+import hashlib
 import json
 import os
 import secrets
+import tempfile
+import threading
+import zlib
 from dataclasses import dataclass
+from functools import cached_property, lru_cache
 from pathlib import Path
 from typing import Any, Dict, Optional
 
+from argon2.low_level import Type as Argon2Type, hash_secret_raw
+from cryptography.exceptions import InvalidTag
 from cryptography.fernet import Fernet, InvalidToken
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-
-
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# Key derivation for secrets.enc. Stores created before settings schema v2
+# used PBKDF2 and are moved to Argon2id the first time they are opened with
+# the default passphrase.
+KDF_PBKDF2 = "pbkdf2-sha256"
+KDF_ARGON2ID = "argon2id"
+_ARGON2_KDF_TIME_COST = 3
+_ARGON2_KDF_MEMORY_COST = 65536  # KiB
+_ARGON2_KDF_PARALLELISM = 1
+# Settings that feed key derivation; changing one drops the derived keys.
+_KDF_PARAM_KEYS = frozenset({"secret_salt", "secret_iterations"})
+
+# secrets.enc holds a 12-byte nonce followed by the AES-256-GCM ciphertext.
+# Older stores are Fernet tokens, recognised by their base64 version prefix
+# and rewritten in the new format once read.
+_GCM_NONCE_SIZE = 12
+_GCM_TAG_SIZE = 16
+_FERNET_PREFIX = b"gAAAAA"
+# Payloads at least this large are zlib-compressed before encryption. A zlib
+# stream starts with 0x78 ("x"), which JSON never does, so both forms decode.
+_SECRETS_COMPRESS_MIN = 4096
+_ZLIB_HEADER = b"x"
+
+
+@lru_cache(maxsize=1)
 def _default_config_dir() -> Path:
     base = os.environ.get("XDG_CONFIG_HOME")
     if base:
@@ -22,6 +56,61 @@ def _default_config_dir() -> Path:
     return Path.home() / ".config" / "case-organizer"
 
 
+def _json_loads(raw: bytes) -> Any:
+    """Parse JSON with orjson when available; both raise json.JSONDecodeError."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _json_dumps(data: Any, *, pretty: bool = False) -> bytes:
+    if orjson is not None:
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_INDENT_2 if pretty else 0
+        return orjson.dumps(data, option=option)
+    if pretty:
+        return json.dumps(data, indent=2, sort_keys=True).encode("utf-8")
+    return json.dumps(data).encode("utf-8")
+
+
+def _default_file_mode(path: Path) -> int:
+    """Mode a plain ``open(path, "w")`` would leave: the existing one, or 0666 less the umask."""
+    try:
+        return os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        pass
+    # The umask can only be read by setting it, so restore it at once.
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def _atomic_write(path: Path, data: bytes, mode: Optional[int] = None) -> None:
+    """Replace ``path`` with ``data`` so readers never see a partial file.
+
+    Each call writes its own uniquely named temp file, created private and
+    set to ``mode`` before the rename, so concurrent writers never share one.
+    Without ``mode`` the file keeps its current permissions (or follows the
+    umask when new).
+    """
+    if mode is None:
+        mode = _default_file_mode(path)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".")
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            os.fchmod(fh.fileno(), mode)
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        raise
+
+
 @dataclass
 class SettingsPaths:
     config_dir: Path
@@ -32,25 +121,43 @@ class SettingsPaths:
 class SettingsManager:
     """Handles persistence of application settings and encrypted secrets."""
 
-    SETTINGS_SCHEMA_VERSION = 1
+    SETTINGS_SCHEMA_VERSION = 2
 
     def __init__(self, config_dir: Optional[Path] = None) -> None:
+        base = config_dir or _default_config_dir()
         self.paths = SettingsPaths(
-            config_dir=config_dir or _default_config_dir(),
-            settings_file=(config_dir or _default_config_dir()) / "settings.json",
-            secrets_file=(config_dir or _default_config_dir()) / "secrets.enc",
+            config_dir=base,
+            settings_file=base / "settings.json",
+            secrets_file=base / "secrets.enc",
         )
         self.paths.config_dir.mkdir(parents=True, exist_ok=True)
 
         self._settings: Dict[str, Any] = {}
         self._load_settings()
 
-        env_passphrase = os.environ.get("CASEORG_SECRET_KEY")
-        self.default_passphrase: Optional[str] = env_passphrase
-        if not self.default_passphrase:
-            self.default_passphrase = self._load_or_create_master_key()
+        # Guards every change and write. ``with settings_manager:`` holds it
+        # for the whole block, so other threads' changes wait for the batch
+        # instead of being swept into (or lost from) its flush.
+        self._lock = threading.RLock()
+
+        # Inside ``with settings_manager:`` writes are held back and flushed
+        # once on exit, so saving a form of settings rewrites each file once.
+        self._batch_depth = 0
+        self._settings_dirty = False
+        self._pending_secrets: Dict[Optional[str], Dict[str, Any]] = {}
+        # Last decrypted secrets payload with the key that opened it and the
+        # file's mtime/size; reused until secrets.enc changes on disk.
+        self._secrets_cache: Optional[tuple[bytes, int, int, Dict[str, Any]]] = None
+
+        # Key derivation is deliberately slow, so derived keys (and the cipher
+        # built from each) are kept for the life of the process. Keys are
+        # looked up by KDF and passphrase; the salt and iteration count are
+        # parsed once and the cache is dropped whenever either changes.
+        self._key_cache: Dict[tuple[str, str], bytes] = {}
+        self._aead_cache: Dict[bytes, AESGCM] = {}
 
         self._ensure_schema()
+        self._refresh_kdf_params()
 
     # ------------------------------------------------------------------
     # Public API for plain settings
@@ -58,62 +165,133 @@ class SettingsManager:
     def get(self, key: str, default: Any = None) -> Any:
         return self._settings.get(key, default)
 
+    def get_many(self, defaults: Dict[str, Any]) -> Dict[str, Any]:
+        """Return each key in ``defaults`` with its stored value or its default."""
+        settings = self._settings
+        return {key: settings.get(key, default) for key, default in defaults.items()}
+
     def set(self, key: str, value: Any) -> None:
-        self._settings[key] = value
-        self._save_settings()
+        with self._lock:
+            self._settings[key] = value
+            if key in _KDF_PARAM_KEYS:
+                self._refresh_kdf_params()
+            self._settings_changed()
 
     def delete(self, key: str) -> None:
-        if key in self._settings:
-            del self._settings[key]
-            self._save_settings()
+        with self._lock:
+            if key in self._settings:
+                del self._settings[key]
+                if key in _KDF_PARAM_KEYS:
+                    self._refresh_kdf_params()
+                self._settings_changed()
+
+    def __enter__(self) -> "SettingsManager":
+        self._lock.acquire()
+        self._batch_depth += 1
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        try:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                # Flush even on error: the in-memory values already changed.
+                self.flush()
+        finally:
+            self._lock.release()
+
+    def flush(self) -> None:
+        """Write any settings or secrets held back by an open batch."""
+        with self._lock:
+            if self._settings_dirty:
+                self._settings_dirty = False
+                self._save_settings()
+            pending, self._pending_secrets = self._pending_secrets, {}
+            for passphrase, payload in pending.items():
+                self._store_secrets(payload, passphrase)
 
     # ------------------------------------------------------------------
     # Secret handling
     # ------------------------------------------------------------------
     def get_secret(self, key: str, default: Any = None, passphrase: Optional[str] = None) -> Any:
-        payload = self._load_secrets(passphrase)
-        if payload is None:
-            return default
-        return payload.get(key, default)
+        with self._lock:
+            payload = self._load_secrets(passphrase)
+            if payload is None:
+                return default
+            return payload.get(key, default)
 
     def set_secret(self, key: str, value: Any, passphrase: Optional[str] = None) -> None:
-        payload = self._load_secrets(passphrase) or {}
-        payload[key] = value
-        self._store_secrets(payload, passphrase)
+        with self._lock:
+            payload = self._load_secrets(passphrase) or {}
+            payload[key] = value
+            self._secrets_changed(payload, passphrase)
 
     def delete_secret(self, key: str, passphrase: Optional[str] = None) -> None:
-        payload = self._load_secrets(passphrase)
-        if not payload or key not in payload:
-            return
-        payload.pop(key)
-        self._store_secrets(payload, passphrase)
+        with self._lock:
+            payload = self._load_secrets(passphrase)
+            if not payload or key not in payload:
+                return
+            payload.pop(key)
+            self._secrets_changed(payload, passphrase)
+
+    @cached_property
+    def default_passphrase(self) -> Optional[str]:
+        """Passphrase for the secrets store when none is passed explicitly.
+
+        Resolved on first secret access, so processes that never touch
+        secrets do not read (or create) ``master.key``.
+        """
+        return os.environ.get("CASEORG_SECRET_KEY") or self._load_or_create_master_key()
 
     # ------------------------------------------------------------------
     # Internal helpers
     # ------------------------------------------------------------------
+    def _settings_changed(self) -> None:
+        if self._batch_depth:
+            self._settings_dirty = True
+        else:
+            self._save_settings()
+
+    def _secrets_changed(self, payload: Dict[str, Any], passphrase: Optional[str]) -> None:
+        if self._batch_depth:
+            self._pending_secrets[passphrase] = payload
+        else:
+            self._store_secrets(payload, passphrase)
+
     def _load_settings(self) -> None:
         try:
-            with self.paths.settings_file.open("r", encoding="utf-8") as fh:
-                self._settings = json.load(fh)
+            self._settings = _json_loads(self.paths.settings_file.read_bytes())
         except FileNotFoundError:
             self._settings = {}
         except json.JSONDecodeError:
             raise RuntimeError("settings.json is corrupted; please repair or delete it.")
 
     def _save_settings(self) -> None:
-        self.paths.config_dir.mkdir(parents=True, exist_ok=True)
-        with self.paths.settings_file.open("w", encoding="utf-8") as fh:
-            json.dump(self._settings, fh, indent=2, sort_keys=True)
+        with self._lock:
+            self.paths.config_dir.mkdir(parents=True, exist_ok=True)
+            data = _json_dumps(self._settings, pretty=True)
+            _atomic_write(self.paths.settings_file, data)
 
     def _ensure_schema(self) -> None:
         version = int(self._settings.get("schema_version", 0))
+        if version >= self.SETTINGS_SCHEMA_VERSION:
+            return
         if version < 1:
-            self._settings.setdefault("schema_version", self.SETTINGS_SCHEMA_VERSION)
             self._settings.setdefault("secret_iterations", 390_000)
             if "secret_salt" not in self._settings:
                 salt = os.urandom(16)
                 self._settings["secret_salt"] = base64.urlsafe_b64encode(salt).decode("utf-8")
-            self._save_settings()
+        if version < 2:
+            # An existing store keeps PBKDF2 until it can be re-encrypted.
+            existing = self.paths.secrets_file.exists()
+            self._settings.setdefault("secret_kdf", KDF_PBKDF2 if existing else KDF_ARGON2ID)
+        self._settings["schema_version"] = self.SETTINGS_SCHEMA_VERSION
+        self._save_settings()
+
+    def _refresh_kdf_params(self) -> None:
+        salt_b64 = self._settings.get("secret_salt")
+        self._salt: Optional[bytes] = base64.urlsafe_b64decode(salt_b64) if salt_b64 else None
+        self._iterations = int(self._settings.get("secret_iterations", 390_000))
+        self._key_cache.clear()
 
     def _load_or_create_master_key(self) -> str:
         key_path = self.paths.config_dir / "master.key"
@@ -133,55 +311,133 @@ class SettingsManager:
         return key
 
     def _load_secrets(self, passphrase: Optional[str]) -> Optional[Dict[str, Any]]:
-        if not self.paths.secrets_file.exists():
+        pending = self._pending_secrets.get(passphrase)
+        if pending is not None:
+            return pending
+        try:
+            st = os.stat(self.paths.secrets_file)
+        except FileNotFoundError:
             return {}
 
-        key = self._derive_key(passphrase)
-        if key is None:
-            raise RuntimeError(
-                "Secret passphrase required. Set CASEORG_SECRET_KEY or provide passphrase explicitly."
-            )
-
-        fernet = Fernet(key)
-        try:
-            token = self.paths.secrets_file.read_bytes()
-            decrypted = fernet.decrypt(token)
-        except InvalidToken as exc:
-            raise RuntimeError("Unable to decrypt secrets store. Invalid passphrase?") from exc
+        kdf = self._settings.get("secret_kdf", KDF_PBKDF2)
+        key = self._secret_key(passphrase, kdf)
+        cached = self._secrets_cache
+        if (
+            cached is not None
+            and cached[0] == key
+            and cached[1] == st.st_mtime_ns
+            and cached[2] == st.st_size
+        ):
+            return dict(cached[3])
+
+        token = self.paths.secrets_file.read_bytes()
+        decrypted = self._decrypt(key, token)
+        if decrypted is None:
+            # An upgrade interrupted between rewriting secrets.enc and saving
+            # settings.json leaves the store under the other KDF.
+            other = KDF_ARGON2ID if kdf == KDF_PBKDF2 else KDF_PBKDF2
+            key = self._secret_key(passphrase, other)
+            decrypted = self._decrypt(key, token)
+            if decrypted is None:
+                raise RuntimeError("Unable to decrypt secrets store. Invalid passphrase?")
+            kdf = other
+            self._settings["secret_kdf"] = kdf
+            self._save_settings()
 
         try:
-            return json.loads(decrypted.decode("utf-8"))
-        except json.JSONDecodeError as exc:
+            if decrypted[:1] == _ZLIB_HEADER:
+                decrypted = zlib.decompress(decrypted)
+            payload = _json_loads(decrypted)
+        except (zlib.error, json.JSONDecodeError) as exc:
             raise RuntimeError("Secrets store is corrupted.") from exc
 
+        upgrade_kdf = kdf == KDF_PBKDF2 and passphrase is None
+        if upgrade_kdf or token.startswith(_FERNET_PREFIX):
+            # Re-encrypt before recording a KDF switch, so a crash in between
+            # is recovered by the fallback above.
+            if upgrade_kdf:
+                self._settings["secret_kdf"] = KDF_ARGON2ID
+            try:
+                self._store_secrets(payload, passphrase)
+            except Exception:
+                if upgrade_kdf:
+                    self._settings["secret_kdf"] = KDF_PBKDF2
+                raise
+            if upgrade_kdf:
+                self._save_settings()
+            return dict(payload)
+
+        self._secrets_cache = (key, st.st_mtime_ns, st.st_size, payload)
+        # Callers edit the returned dict before storing it, so hand out a copy.
+        return dict(payload)
+
     def _store_secrets(self, payload: Dict[str, Any], passphrase: Optional[str]) -> None:
-        key = self._derive_key(passphrase)
+        key = self._secret_key(passphrase)
+        data = _json_dumps(payload)
+        if len(data) >= _SECRETS_COMPRESS_MIN:
+            data = zlib.compress(data, 3)
+        nonce = os.urandom(_GCM_NONCE_SIZE)
+        token = nonce + self._aead(key).encrypt(nonce, data, None)
+        with self._lock:
+            _atomic_write(self.paths.secrets_file, token, 0o600)
+            st = os.stat(self.paths.secrets_file)
+            self._secrets_cache = (key, st.st_mtime_ns, st.st_size, dict(payload))
+
+    def _decrypt(self, key: bytes, token: bytes) -> Optional[bytes]:
+        """Return the plaintext of ``token``, or None if ``key`` cannot open it."""
+        if token.startswith(_FERNET_PREFIX):
+            try:
+                return Fernet(base64.urlsafe_b64encode(key)).decrypt(token)
+            except InvalidToken:
+                return None
+        if len(token) < _GCM_NONCE_SIZE + _GCM_TAG_SIZE:
+            return None
+        nonce = token[:_GCM_NONCE_SIZE]
+        try:
+            return self._aead(key).decrypt(nonce, token[_GCM_NONCE_SIZE:], None)
+        except InvalidTag:
+            return None
+
+    def _aead(self, key: bytes) -> AESGCM:
+        aead = self._aead_cache.get(key)
+        if aead is None:
+            aead = self._aead_cache[key] = AESGCM(key)
+        return aead
+
+    def _secret_key(self, passphrase: Optional[str], kdf: Optional[str] = None) -> bytes:
+        key = self._derive_key(passphrase, kdf)
         if key is None:
             raise RuntimeError(
                 "Secret passphrase required. Set CASEORG_SECRET_KEY or provide passphrase explicitly."
             )
-        fernet = Fernet(key)
-        data = json.dumps(payload).encode("utf-8")
-        token = fernet.encrypt(data)
-        self.paths.secrets_file.write_bytes(token)
+        return key
 
-    def _derive_key(self, passphrase: Optional[str]) -> Optional[bytes]:
+    def _derive_key(self, passphrase: Optional[str], kdf: Optional[str] = None) -> Optional[bytes]:
         actual = passphrase or self.default_passphrase
         if not actual:
             return None
-        salt_b64 = self._settings.get("secret_salt")
-        if not salt_b64:
+        salt = self._salt
+        if not salt:
             raise RuntimeError("Settings missing secret salt; try reinitialising configuration.")
-        salt = base64.urlsafe_b64decode(salt_b64)
-        iterations = int(self._settings.get("secret_iterations", 390_000))
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=iterations,
-        )
-        key = kdf.derive(actual.encode("utf-8"))
-        return base64.urlsafe_b64encode(key)
+        kdf = kdf or self._settings.get("secret_kdf", KDF_PBKDF2)
+        cache_key = (kdf, actual)
+        cached = self._key_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        if kdf == KDF_ARGON2ID:
+            derived = hash_secret_raw(
+                actual.encode("utf-8"),
+                salt,
+                time_cost=_ARGON2_KDF_TIME_COST,
+                memory_cost=_ARGON2_KDF_MEMORY_COST,
+                parallelism=_ARGON2_KDF_PARALLELISM,
+                hash_len=32,
+                type=Argon2Type.ID,
+            )
+        else:
+            derived = hashlib.pbkdf2_hmac("sha256", actual.encode("utf-8"), salt, self._iterations, dklen=32)
+        self._key_cache[cache_key] = derived
+        return derived
 
 
 settings_manager = SettingsManager()
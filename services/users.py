@@ -4,11 +4,13 @@ from __future__ import annotations
 
 import secrets
 import sqlite3
+import time
 from datetime import datetime, timedelta
+from threading import RLock
 from typing import Optional
 
 from services.db import get_app_db
-from services.security import hash_password, verify_password
+from services.security import hash_password, password_needs_rehash, verify_password
 
 
 class UserExistsError(ValueError):
@@ -19,6 +21,32 @@ class EmailInUseError(UserExistsError):
     """Raised when updating a user to an email that already exists."""
 
 
+_USER_CACHE_TTL_SECONDS = 600
+_USER_CACHE_MAX_ENTRIES = 2048
+_user_cache_lock = RLock()
+_user_cache: dict[int, tuple[float, sqlite3.Row]] = {}
+# Active users offered as message recipients; rebuilt after any user change.
+# The generation stops a query that raced an invalidation from being cached.
+_recipient_cache: Optional[list[sqlite3.Row]] = None
+_user_generation = 0
+# COUNT(*) results for the user table, keyed by the query; also rebuilt after
+# any user change.
+_user_counts: dict[str, int] = {}
+
+
+def invalidate_user_cache(user_id: Optional[int] = None) -> None:
+    """Drop a cached user row (or every cached row) after the user changes."""
+    global _recipient_cache, _user_generation
+    with _user_cache_lock:
+        _recipient_cache = None
+        _user_counts.clear()
+        _user_generation += 1
+        if user_id is None:
+            _user_cache.clear()
+        else:
+            _user_cache.pop(int(user_id), None)
+
+
 def normalize_email(email: str) -> str:
     return (email or "").strip().lower()
 
@@ -43,6 +71,7 @@ def create_user(email: str, password: str, role: str = "user", is_active: bool =
         conn.commit()
     except sqlite3.IntegrityError as exc:
         raise UserExistsError(f"User with email {email_norm!r} already exists") from exc
+    invalidate_user_cache(int(cur.lastrowid))
 
     return int(cur.lastrowid)
 
@@ -59,26 +88,87 @@ def get_user_by_email(email: str) -> Optional[sqlite3.Row]:
 
 
 def get_user_by_id(user_id: int) -> Optional[sqlite3.Row]:
+    """Return a user row, served from a short-lived per-process cache.
+
+    Every function here that modifies a user invalidates its entry.
+    """
+    key = int(user_id)
+    now = time.monotonic()
+    with _user_cache_lock:
+        cached = _user_cache.get(key)
+        if cached is not None and (now - cached[0]) < _USER_CACHE_TTL_SECONDS:
+            return cached[1]
+        generation = _user_generation
+
     conn = get_app_db()
-    return conn.execute(
+    row = conn.execute(
         "SELECT * FROM users WHERE id = ?",
-        (user_id,),
+        (key,),
+    ).fetchone()
+    if row is not None:
+        with _user_cache_lock:
+            # A change committed since the SELECT may already have been
+            # invalidated; caching this row would then resurrect it.
+            if generation != _user_generation:
+                return row
+            if len(_user_cache) >= _USER_CACHE_MAX_ENTRIES:
+                _user_cache.clear()
+            _user_cache[key] = (now, row)
+    return row
+
+
+def _get_user_login_row(email: str) -> Optional[sqlite3.Row]:
+    """Fetch just the columns a login needs, by normalised email."""
+    email_norm = normalize_email(email)
+    if not email_norm:
+        return None
+    conn = get_app_db()
+    return conn.execute(
+        "SELECT id, email, role, password_hash, is_active FROM users WHERE email = ?",
+        (email_norm,),
     ).fetchone()
 
 
 def authenticate_user(email: str, password: str) -> Optional[sqlite3.Row]:
-    user = get_user_by_email(email)
+    user = _get_user_login_row(email)
     if not user or not user["is_active"]:
         return None
     if not verify_password(password, user["password_hash"]):
         return None
+    if password_needs_rehash(user["password_hash"]):
+        set_user_password(user["id"], password)
     return user
 
 
-def count_users() -> int:
+def authenticate_user_by_id(user_id: int, password: str) -> bool:
+    """Check ``password`` for an already identified, active user."""
     conn = get_app_db()
-    row = conn.execute("SELECT COUNT(*) AS c FROM users").fetchone()
-    return int(row["c"] if row else 0)
+    row = conn.execute(
+        "SELECT password_hash FROM users WHERE id = ? AND is_active = 1",
+        (user_id,),
+    ).fetchone()
+    if not row or not verify_password(password, row["password_hash"]):
+        return False
+    if password_needs_rehash(row["password_hash"]):
+        set_user_password(user_id, password)
+    return True
+
+
+def _cached_count(sql: str) -> int:
+    with _user_cache_lock:
+        count = _user_counts.get(sql)
+        generation = _user_generation
+    if count is None:
+        conn = get_app_db()
+        count = conn.execute(sql).fetchone()[0]
+        with _user_cache_lock:
+            if generation == _user_generation:
+                _user_counts[sql] = count
+    return count
+
+
+def count_users() -> int:
+    return _cached_count("SELECT COUNT(*) FROM users")
 
 
 def set_user_password(user_id: int, password: str) -> None:
@@ -88,6 +178,7 @@ def set_user_password(user_id: int, password: str) -> None:
         (hash_password(password), user_id),
     )
     conn.commit()
+    invalidate_user_cache(user_id)
 
 
 def mark_user_login(user_id: int) -> None:
@@ -97,6 +188,7 @@ def mark_user_login(user_id: int) -> None:
         (user_id,),
     )
     conn.commit()
+    invalidate_user_cache(user_id)
 
 
 def create_password_reset_token(user_id: int, expires_minutes: int = 30) -> str:
@@ -104,15 +196,20 @@ def create_password_reset_token(user_id: int, expires_minutes: int = 30) -> str:
     expires_at = (datetime.utcnow() + timedelta(minutes=expires_minutes)).isoformat()
 
     conn = get_app_db()
-    conn.execute("DELETE FROM password_resets WHERE user_id = ? AND consumed_at IS NULL", (user_id,))
-    conn.execute(
-        """
-        INSERT INTO password_resets(user_id, token, expires_at)
-        VALUES(?, ?, ?)
-        """,
-        (user_id, token, expires_at),
-    )
-    conn.commit()
+    # idx_password_resets_active_user allows one outstanding token per user,
+    # so a new token replaces the old one in a single statement.
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO password_resets(user_id, token, expires_at)
+            VALUES(?, ?, ?)
+            ON CONFLICT(user_id) WHERE consumed_at IS NULL DO UPDATE SET
+                token = excluded.token,
+                expires_at = excluded.expires_at,
+                created_at = CURRENT_TIMESTAMP
+            """,
+            (user_id, token, expires_at),
+        )
     return token
 
 
@@ -120,20 +217,15 @@ def get_password_reset(token: str) -> Optional[sqlite3.Row]:
     if not token:
         return None
     conn = get_app_db()
-    row = conn.execute(
-        "SELECT * FROM password_resets WHERE token = ?",
-        (token,),
+    # expires_at is written by datetime.isoformat(), so ISO strings compare
+    # in time order and the expiry check can run in SQL.
+    return conn.execute(
+        """
+        SELECT * FROM password_resets
+        WHERE token = ? AND consumed_at IS NULL AND expires_at > ?
+        """,
+        (token, datetime.utcnow().isoformat()),
     ).fetchone()
-    if not row or row["consumed_at"] is not None:
-        return None
-    expires_at_raw = row["expires_at"]
-    try:
-        expires_at = datetime.fromisoformat(expires_at_raw)
-    except Exception:
-        return None
-    if expires_at < datetime.utcnow():
-        return None
-    return row
 
 
 def consume_password_reset(reset_id: int) -> None:
@@ -152,6 +244,23 @@ def list_users() -> list[sqlite3.Row]:
     ).fetchall()
 
 
+def list_message_recipients(exclude_user_id: int) -> list[sqlite3.Row]:
+    """Return active users other than ``exclude_user_id``, ordered by email."""
+    global _recipient_cache
+    with _user_cache_lock:
+        rows = _recipient_cache
+        generation = _user_generation
+    if rows is None:
+        conn = get_app_db()
+        rows = conn.execute(
+            "SELECT id, email, role FROM users WHERE is_active = 1 ORDER BY email COLLATE NOCASE"
+        ).fetchall()
+        with _user_cache_lock:
+            if generation == _user_generation:
+                _recipient_cache = rows
+    return [row for row in rows if row["id"] != exclude_user_id]
+
+
 def set_user_active(user_id: int, active: bool) -> None:
     conn = get_app_db()
     conn.execute(
@@ -159,15 +268,22 @@ def set_user_active(user_id: int, active: bool) -> None:
         (1 if active else 0, user_id),
     )
     conn.commit()
+    invalidate_user_cache(user_id)
 
 
 def count_admins(active_only: bool = True) -> int:
-    conn = get_app_db()
     if active_only:
-        row = conn.execute("SELECT COUNT(*) AS c FROM users WHERE role = 'admin' AND is_active = 1").fetchone()
-    else:
-        row = conn.execute("SELECT COUNT(*) AS c FROM users WHERE role = 'admin'").fetchone()
-    return int(row["c"] if row else 0)
+        return _cached_count("SELECT COUNT(*) FROM users WHERE role = 'admin' AND is_active = 1")
+    return _cached_count("SELECT COUNT(*) FROM users WHERE role = 'admin'")
+
+
+def get_sole_active_admin_id() -> Optional[int]:
+    """Return the id of the only active administrator, or None if there are several."""
+    conn = get_app_db()
+    rows = conn.execute(
+        "SELECT id FROM users WHERE role = 'admin' AND is_active = 1 LIMIT 2"
+    ).fetchall()
+    return int(rows[0]["id"]) if len(rows) == 1 else None
 
 
 def update_user_email(user_id: int, new_email: str) -> None:
@@ -183,6 +299,7 @@ def update_user_email(user_id: int, new_email: str) -> None:
         conn.commit()
     except sqlite3.IntegrityError as exc:
         raise EmailInUseError(f"Email {email_norm!r} is already registered") from exc
+    invalidate_user_cache(user_id)
 
 
 def update_user_role(user_id: int, new_role: str) -> None:
@@ -194,3 +311,4 @@ def update_user_role(user_id: int, new_role: str) -> None:
         (new_role, user_id),
     )
     conn.commit()
+    invalidate_user_cache(user_id)
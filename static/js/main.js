@@ -1131,6 +1131,9 @@ function manageCaseForm(){
   renderSelected();
 }
 
+// Set by the case-law search form so an upload can refresh its year options.
+let refreshCaseLawFilters = null;
+
 function caseLawUploadForm(){
   const host = $('#form-host');
   if (!host) return;
@@ -1276,6 +1279,7 @@ function caseLawUploadForm(){
         throw new Error(data.msg || `HTTP ${resp.status}`);
       }
       alert('Case law uploaded successfully.');
+      refreshCaseLawFilters?.();
       ['clu-petitioner','clu-respondent','clu-citation','clu-note'].forEach(id => {
         const elField = document.getElementById(id);
         if (elField) elField.value = '';
@@ -1567,6 +1571,7 @@ function caseLawSearchForm(){
               throw new Error(data.msg || `HTTP ${resp.status}`);
             }
             card.remove();
+            refreshCaseLawFilters?.();
             if (resultsHost && !resultsHost.querySelector('.case-law-card')) {
               resultsHost.innerHTML = '<div class="result-item">No case law found.</div>';
             }
@@ -1649,9 +1654,6 @@ function caseLawSearchForm(){
         throw new Error(data.error || `HTTP ${resp.status}`);
       }
       renderResults(data.results || []);
-      if (data.filters) {
-        applyFilters(data.filters);
-      }
     } catch (err) {
       alert(`Search failed: ${err.message || err}`);
     }
@@ -1689,16 +1691,16 @@ function caseLawSearchForm(){
 
   async function loadFilters(){
     try {
-      const resp = await fetch('/case-law/search?limit=1');
+      // Always revalidate: the ETag turns an unchanged list into a 304.
+      const resp = await fetch('/case-law/filters', { cache: 'no-cache' });
       const data = await resp.json().catch(()=>({}));
-      if (data.filters) {
-        applyFilters(data.filters);
-      }
+      applyFilters(data);
     } catch (err) {
       console.warn('Failed to load case-law filters', err);
     }
   }
 
+  refreshCaseLawFilters = loadFilters;
   loadFilters();
 }
 
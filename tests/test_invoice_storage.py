@@ -0,0 +1,26 @@
+import tempfile
+import unittest
+from concurrent.futures import Future
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
+
+import app
+
+
+class StoreRenderedInvoiceTests(unittest.TestCase):
+    def test_write_failure_raises_invoice_storage_error(self):
+        render: Future = Future()
+        render.set_result((BytesIO(b"%PDF-1.4 test"), "INV-1.pdf"))
+        with tempfile.TemporaryDirectory() as tmp:
+            target = Path(tmp) / "missing" / "INV-1.pdf"
+            with mock.patch.object(app, "_invoice_target_path", return_value=(target, None)):
+                with self.assertRaises(app.InvoiceStorageError):
+                    app._store_rendered_invoice(
+                        render, {"invoice_number": "INV-1"}, None, None, None
+                    )
+            self.assertFalse(target.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
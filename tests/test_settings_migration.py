@@ -0,0 +1,68 @@
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from cryptography.fernet import Fernet
+
+from services.settings import KDF_ARGON2ID, SettingsManager
+
+
+def _write_baseline_store(config_dir: Path, passphrase: str, secrets: dict) -> None:
+    """Lay out settings.json and secrets.enc as the PBKDF2/Fernet release did."""
+    salt = os.urandom(16)
+    iterations = 1_000
+    settings = {
+        "schema_version": 1,
+        "secret_iterations": iterations,
+        "secret_salt": base64.urlsafe_b64encode(salt).decode("utf-8"),
+    }
+    (config_dir / "settings.json").write_text(json.dumps(settings), encoding="utf-8")
+    (config_dir / "master.key").write_text(passphrase, encoding="utf-8")
+    key = hashlib.pbkdf2_hmac("sha256", passphrase.encode("utf-8"), salt, iterations, dklen=32)
+    token = Fernet(base64.urlsafe_b64encode(key)).encrypt(json.dumps(secrets).encode("utf-8"))
+    (config_dir / "secrets.enc").write_bytes(token)
+
+
+class LegacySecretsMigrationTests(unittest.TestCase):
+    def setUp(self):
+        self._old_umask = os.umask(0o077)
+        self._old_env = os.environ.pop("CASEORG_SECRET_KEY", None)
+        self._tmp = tempfile.TemporaryDirectory()
+        self.config_dir = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+        os.umask(self._old_umask)
+        if self._old_env is not None:
+            os.environ["CASEORG_SECRET_KEY"] = self._old_env
+
+    def test_fernet_store_is_reencrypted_and_still_readable(self):
+        _write_baseline_store(self.config_dir, "legacy-passphrase", {"smtp_password": "hunter2"})
+        settings_file = self.config_dir / "settings.json"
+        secrets_file = self.config_dir / "secrets.enc"
+        settings_file.chmod(0o640)
+
+        manager = SettingsManager(config_dir=self.config_dir)
+        self.assertEqual(manager.get_secret("smtp_password"), "hunter2")
+        self.assertEqual(manager.get("secret_kdf"), KDF_ARGON2ID)
+        self.assertFalse(secrets_file.read_bytes().startswith(b"gAAAAA"))
+
+        reloaded = SettingsManager(config_dir=self.config_dir)
+        self.assertEqual(reloaded.get_secret("smtp_password"), "hunter2")
+
+        self.assertEqual(settings_file.stat().st_mode & 0o777, 0o640)
+        self.assertEqual(secrets_file.stat().st_mode & 0o777, 0o600)
+
+    def test_new_settings_file_follows_umask(self):
+        manager = SettingsManager(config_dir=self.config_dir)
+        manager.set("theme", "dark")
+        mode = (self.config_dir / "settings.json").stat().st_mode & 0o777
+        self.assertEqual(mode, 0o600)
+
+
+if __name__ == "__main__":
+    unittest.main()